@@ -0,0 +1,178 @@
+import io
+import os
+import time
+import wave
+import threading
+import numpy as np
+
+TARGET_RATE = int(os.getenv("AUDIO_TARGET_RATE", "16000"))
+FRAME_MS = 20
+PAD_BEFORE_MS = 200
+PAD_AFTER_MS = 300
+SPEECH_RATIO = 3.0          # speech frames are this many times louder than the noise floor
+MIN_SPEECH_RMS = 0.003      # absolute floor, in full-scale units
+TARGET_PEAK = 0.7           # about -3 dBFS
+MAX_GAIN = 10.0             # +20 dB
+NOISE_ALPHA = 0.2           # weight of each new clip in the per-device noise floor
+MAX_NOISE_FLOOR = 0.01      # about -40 dBFS; louder "noise" is assumed to be speech
+MAX_FLOOR_RISE = 1.5        # one clip can raise a device's floor by at most this factor
+MIN_NOISE_FRAMES = 5        # non-speech frames needed before a clip updates the floor
+
+
+class NoiseProfiles:
+    """Per-device noise floor (frame RMS), learned across requests"""
+
+    def __init__(self):
+        self._floors = {}
+        self._lock = threading.Lock()
+
+    def get(self, device):
+        return self._floors.get(device)
+
+    def update(self, device, estimate):
+        with self._lock:
+            floor = self._floors.get(device)
+            self._floors[device] = estimate if floor is None else (1 - NOISE_ALPHA) * floor + NOISE_ALPHA * estimate
+            return self._floors[device]
+
+    def snapshot(self):
+        return {device: round(floor, 5) for device, floor in self._floors.items()}
+
+
+noise_profiles = NoiseProfiles()
+
+
+def decode_wav(audio_data):
+    """WAV bytes -> (mono float32 samples in [-1, 1], sample rate)"""
+    with wave.open(io.BytesIO(audio_data), "rb") as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    return pcm_samples(frames, channels, width), rate
+
+
+def pcm_samples(frames, channels, width):
+    """Interleaved PCM bytes -> mono float32 samples in [-1, 1]"""
+    if width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {width}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def encode_wav(samples, rate):
+    pcm = np.clip(samples * 32768.0, -32768, 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def frame_rms(samples, rate):
+    frame = max(int(rate * FRAME_MS / 1000), 1)
+    usable = len(samples) // frame * frame
+    if not usable:
+        return np.zeros(0, dtype=np.float32), frame
+    frames = samples[:usable].reshape(-1, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1)), frame
+
+
+def resample(samples, rate, target):
+    """Block-average decimation for integer ratios, linear interpolation otherwise"""
+    if not target or rate <= target:
+        return samples, rate
+    if rate % target == 0:
+        factor = rate // target
+        usable = len(samples) // factor * factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1), target
+    length = int(len(samples) * target / rate)
+    positions = np.linspace(0, len(samples) - 1, length)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32), target
+
+
+def preprocess_audio(audio_data, device="unknown", target_rate=TARGET_RATE):
+    """Trim silence, normalize gain and downsample a WAV clip
+
+    Returns new WAV bytes. Clips with nothing louder than the device's
+    learned noise floor, and undecodable input, are passed through unchanged
+    so the STT backends can still try them.
+    """
+    try:
+        samples, rate = decode_wav(audio_data)
+    except Exception as e:
+        print(f"[AUDIO] Preprocessing skipped: {e}")
+        return audio_data
+
+    samples = samples - samples.mean() if len(samples) else samples
+    energies, frame = frame_rms(samples, rate)
+    if not len(energies):
+        return audio_data
+
+    # Without a learned floor, the quietest 10% of frames estimate it
+    floor = noise_profiles.get(device)
+    if floor is None:
+        floor = min(float(np.percentile(energies, 10)), MAX_NOISE_FLOOR)
+    threshold = max(MIN_SPEECH_RMS, SPEECH_RATIO * floor)
+    voiced = energies > threshold
+
+    # Learn only from frames that aren't speech, so tightly trimmed clips
+    # can't drag the floor up to speech level
+    quiet = energies[~voiced]
+    if len(quiet) >= MIN_NOISE_FRAMES:
+        estimate = min(float(np.median(quiet)), floor * MAX_FLOOR_RISE, MAX_NOISE_FLOOR)
+        noise_profiles.update(device, estimate)
+
+    voiced = np.flatnonzero(voiced)
+    if not len(voiced):
+        print(f"[AUDIO] No speech above noise floor from {device}, passing clip through")
+        return audio_data
+
+    start = max(voiced[0] * frame - int(rate * PAD_BEFORE_MS / 1000), 0)
+    end = min((voiced[-1] + 1) * frame + int(rate * PAD_AFTER_MS / 1000), len(samples))
+    samples = samples[start:end]
+
+    peak = float(np.max(np.abs(samples)))
+    if peak > 0:
+        samples = samples * min(TARGET_PEAK / peak, MAX_GAIN)
+
+    samples, rate = resample(samples, rate, target_rate)
+    return encode_wav(samples, rate)
+
+
+def synthetic_clip(rate=44100, lead=0.8, speech=1.5, tail=1.0, noise=0.005, seed=0):
+    """Noise, a voiced burst (harmonics with a syllable envelope), then noise"""
+    rng = np.random.default_rng(seed)
+    total = int(rate * (lead + speech + tail))
+    samples = rng.normal(0, noise, total).astype(np.float32)
+    t = np.arange(int(rate * speech)) / rate
+    envelope = 0.5 * (1 - np.cos(2 * np.pi * 4 * t))
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 700)))
+    start = int(rate * lead)
+    samples[start:start + len(t)] += 0.2 * envelope * voice
+    return encode_wav(samples, rate)
+
+
+if __name__ == "__main__":
+    runs = 20
+    for rate in (44100, 16000):
+        clip = synthetic_clip(rate=rate)
+        preprocess_audio(clip, device="bench_mic")  # learn the noise floor
+        start = time.perf_counter()
+        for _ in range(runs):
+            output = preprocess_audio(clip, device="bench_mic")
+        elapsed = (time.perf_counter() - start) / runs
+        saved = 1 - len(output) / len(clip)
+        print(f"{rate} Hz clip: {len(clip):,} -> {len(output):,} bytes ({saved:.0%} saved), "
+              f"{elapsed * 1000:.2f} ms per clip")
+
+    silence = encode_wav(np.random.default_rng(1).normal(0, 0.005, 16000 * 2).astype(np.float32), 16000)
+    print(f"Noise-only clip: {'passed through' if preprocess_audio(silence, device='bench_mic') == silence else 'trimmed'}")
+    print(f"Noise floors: {noise_profiles.snapshot()}")
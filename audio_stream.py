@@ -0,0 +1,148 @@
+import struct
+import threading
+
+WAV_HEADER_SIZE = 44
+# WSGI inputs fill the whole read before returning, so keep reads small
+# (4 KiB is ~128 ms of 16 kHz mono 16-bit audio)
+READ_SIZE = 4096
+
+
+class UploadError(Exception):
+    """The client's audio upload failed or was malformed"""
+
+
+class UploadTooLarge(UploadError):
+    """The client's audio upload went past the stream's max_size"""
+
+
+def wav_header(sample_rate, channels, sample_width, data_size):
+    """Canonical 44-byte PCM WAV header"""
+    byte_rate = sample_rate * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b"data", data_size,
+    )
+
+
+class AudioStream:
+    """Single-buffer audio upload that consumers can read while it is still arriving
+
+    Request body chunks are read straight into one growing bytearray. Raw PCM
+    uploads get a WAV header reserved up front and patched on close, so the
+    finished buffer is a valid WAV without copying the samples again.
+    Streaming consumers use pcm_chunks(); buffered consumers use getvalue().
+    Writes that would grow the buffer past max_size bytes raise UploadTooLarge.
+    """
+
+    def __init__(self, pcm_format=None, max_size=None):
+        self.pcm_format = pcm_format
+        self.max_size = max_size
+        self.sample_rate = self.channels = self.sample_width = None
+        self.data_offset = None
+        self.complete = False
+        self.error = None
+        self._buffer = bytearray()
+        self._value = None
+        self._cond = threading.Condition()
+        if pcm_format:
+            self.sample_rate, self.channels, self.sample_width = pcm_format
+            self._buffer += wav_header(*pcm_format, 0)
+            self.data_offset = WAV_HEADER_SIZE
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def write(self, chunk):
+        with self._cond:
+            if self.max_size is not None and len(self._buffer) + len(chunk) > self.max_size:
+                raise UploadTooLarge(f"Audio upload exceeds {self.max_size} bytes")
+            self._buffer += chunk
+            if self.data_offset is None:
+                self._parse_header()
+            self._cond.notify_all()
+
+    def ingest(self, stream, content_length=None):
+        """Read a WSGI input stream to the end, then close"""
+        remaining = content_length
+        while remaining is None or remaining > 0:
+            size = READ_SIZE if remaining is None else min(READ_SIZE, remaining)
+            chunk = stream.read(size)
+            if not chunk:
+                break
+            self.write(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+        self.close()
+
+    def close(self, error=None):
+        with self._cond:
+            self.error = error
+            if self.pcm_format and error is None:
+                data_size = len(self._buffer) - WAV_HEADER_SIZE
+                self._buffer[:WAV_HEADER_SIZE] = wav_header(*self.pcm_format, data_size)
+            self.complete = True
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until the upload has finished; True if it finished cleanly"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.complete, timeout)
+            return self.complete and self.error is None
+
+    def getvalue(self):
+        """Complete WAV bytes (one copy, shared by every buffered consumer)"""
+        if not self.wait():
+            raise UploadError(f"Audio upload incomplete: {self.error}")
+        with self._cond:
+            if self._value is None:
+                self._value = bytes(self._buffer)
+            return self._value
+
+    def pcm_chunks(self):
+        """Yield PCM sample data as it arrives, ending when the upload does"""
+        position = None
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self.complete or (self.data_offset is not None
+                                              and len(self._buffer) > (position or self.data_offset))
+                )
+                if self.error is not None:
+                    raise UploadError(f"Audio upload failed: {self.error}")
+                if self.data_offset is None:
+                    return
+                if position is None:
+                    position = self.data_offset
+                end = len(self._buffer)
+                # Copy via a memoryview so the bytearray isn't sliced twice
+                with memoryview(self._buffer) as view, view[position:end] as window:
+                    chunk = bytes(window)
+                done = self.complete
+            if chunk:
+                position = end
+                yield chunk
+            if done and position >= end:
+                return
+
+    def _parse_header(self):
+        """Locate fmt and data chunks of a streamed WAV once enough bytes are in"""
+        buffer = self._buffer
+        if len(buffer) < 12:
+            return
+        if buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+            raise UploadError("Audio stream is not a RIFF/WAVE file")
+        offset = 12
+        while offset + 8 <= len(buffer):
+            chunk_id = bytes(buffer[offset:offset + 4])
+            chunk_size = struct.unpack_from("<I", buffer, offset + 4)[0]
+            if chunk_id == b"data":
+                self.data_offset = offset + 8
+                return
+            if offset + 8 + chunk_size > len(buffer):
+                return
+            if chunk_id == b"fmt ":
+                _, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", buffer, offset + 8)
+                self.channels, self.sample_rate, self.sample_width = channels, sample_rate, bits // 8
+            offset += 8 + chunk_size + (chunk_size & 1)
@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from fake_services import FakeServices, Faults
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Phrasings the local grammar can't resolve, so they take the GPT path
+GPT_UTTERANCES = [
+    "make the workshop bright",
+    "it's too dark in the conservatory",
+    "I'm heading to bed, kill the decking",
+]
+
+LAUNCH = (
+    "import sys, main; main.get_intent_engine(); "
+    "main.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"
+)
+
+
+def load_utterances(path=None):
+    """Texts from a JSON list of strings or of {"text": ...} objects"""
+    with open(path or os.path.join(HERE, "retrieval_eval.json")) as f:
+        items = json.load(f)
+    texts = [item["text"] if isinstance(item, dict) else item for item in items]
+    return texts if path else texts + GPT_UTTERANCES
+
+
+def load_clips(paths=()):
+    if paths:
+        clips = []
+        for path in paths:
+            with open(path, "rb") as f:
+                clips.append(f.read())
+        return clips
+    from audio_preprocess import synthetic_clip
+    return [synthetic_clip(rate=16000, seed=i) for i in range(8)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                  capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=HERE,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{revision}{'-dirty' if dirty else ''}" or "unknown"
+    except OSError:
+        return "unknown"
+
+
+class ServerUnderTest:
+    """main.py in a subprocess, pointed at the fake services"""
+
+    def __init__(self, environment, log_path):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(os.environ, **environment)
+        self._log = open(log_path, "w")
+        self._process = subprocess.Popen([sys.executable, "-c", LAUNCH, str(self.port)], cwd=HERE, env=env,
+                                         stdout=self._log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"main.py exited with status {self._process.returncode}, see {self._log.name}")
+            try:
+                if requests.get(f"{self.url}/api/health", timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"main.py did not become ready within {timeout}s, see {self._log.name}")
+
+    def stop(self):
+        self._process.terminate()
+        try:
+            self._process.wait(10)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._log.close()
+
+
+def run_load(url, build_request, count, concurrency, warmup=0):
+    """Issue count requests from `concurrency` threads; (latencies, statuses, seconds)"""
+    local = threading.local()
+    latencies = [None] * count
+    statuses = [None] * count
+
+    def send(index):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        path, payload = build_request(index)
+        start = time.perf_counter()
+        try:
+            status = session.post(f"{url}{path}", json=payload, timeout=60).status_code
+        except requests.RequestException:
+            status = 0
+        return time.perf_counter() - start, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(warmup)))
+        start = time.perf_counter()
+
+        def record(index):
+            latencies[index], statuses[index] = send(index)
+
+        list(executor.map(record, range(count)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed
+
+
+def summarize(latencies, statuses, elapsed):
+    ms = np.array(latencies) * 1000
+    ok = sum(1 for status in statuses if 200 <= status < 300)
+    errors = {}
+    for status in statuses:
+        if not 200 <= status < 300:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    return {
+        "requests": len(statuses),
+        "ok": ok,
+        "errors": errors,
+        "throughput_rps": round(len(statuses) / elapsed, 2),
+        "mean_ms": round(float(ms.mean()), 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1),
+    }
+
+
+def scrape_quantiles(url):
+    """Server-side p50/p95/p99 per histogram from /api/metrics"""
+    quantiles = {}
+    try:
+        text = requests.get(f"{url}/api/metrics", timeout=5).text
+    except requests.RequestException:
+        return quantiles
+    for line in text.splitlines():
+        if line.startswith("#") or "_quantile{" not in line:
+            continue
+        series, value = line.rsplit(" ", 1)
+        metric, labels = series.split("{", 1)
+        fields = dict(part.split("=", 1) for part in labels.rstrip("}").split('",'))
+        name = fields["name"].strip('"')
+        q = fields["quantile"].strip('"')
+        family = metric[len("jarvis_"):-len("_seconds_quantile")]
+        key = f"p{round(float(q) * 100)}_ms"
+        quantiles.setdefault(f"{family}.{name}", {})[key] = round(float(value) * 1000, 1)
+    return quantiles
+
+
+def compare(report, baseline):
+    print(f"\nCompared with {baseline.get('revision', 'baseline')}:")
+    for scenario, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if not before:
+            continue
+        changes = []
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before.get(key):
+                change = (result[key] - before[key]) / before[key] * 100
+                changes.append(f"{key} {before[key]} -> {result[key]} ({change:+.1f}%)")
+        print(f"  {scenario}: " + ", ".join(changes))
+
+
+def print_report(report):
+    print(f"\nRevision {report['revision']}, concurrency {report['concurrency']}")
+    print(f"{'scenario':<10}{'reqs':>6}{'ok':>6}{'rps':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for scenario, r in report["scenarios"].items():
+        print(f"{scenario:<10}{r['requests']:>6}{r['ok']:>6}{r['throughput_rps']:>9}{r['mean_ms']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}"
+              + (f"  errors {r['errors']}" if r["errors"] else ""))
+    if report.get("server"):
+        print("\nServer-side latency (ms):")
+        for name, q in sorted(report["server"].items()):
+            print(f"  {name:<36} p50 {q.get('p50_ms', 0):>8}  p95 {q.get('p95_ms', 0):>8}  p99 {q.get('p99_ms', 0):>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of main.py against local fake services")
+    parser.add_argument("--scenario", choices=["text", "audio", "all"], default="all")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=1,
+                        help="spread requests over this many mics (more than one exercises coalescing)")
+    parser.add_argument("--utterances", help="JSON list of utterances (default: retrieval_eval.json plus GPT phrasings)")
+    parser.add_argument("--wav", nargs="*", default=[], help="WAV clips to upload (default: synthetic clips)")
+    parser.add_argument("--ha-faults", default="0.02,0.01", help="latency,jitter,failure_rate[,status]")
+    parser.add_argument("--llm-faults", default="0.3,0.1")
+    parser.add_argument("--whisper-faults", default="0.4,0.1")
+    parser.add_argument("--google-faults", default="0.5,0.1")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--compare", help="JSON report from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    utterances = load_utterances(args.utterances)
+    clips = [base64.b64encode(clip).decode() for clip in load_clips(args.wav)]
+    devices = [f"bench_{i}_mic" for i in range(args.devices)]
+
+    def text_request(index):
+        return "/api/voice_trigger", {"text": utterances[index % len(utterances)],
+                                      "device": devices[index % len(devices)], "source": "benchmark"}
+
+    def audio_request(index):
+        return "/api/audio_upload", {"audio_data": clips[index % len(clips)], "device": devices[index % len(devices)],
+                                     "timestamp": str(index)}
+
+    services = server = None
+    workdir = tempfile.mkdtemp(prefix="jarvis-bench-")
+    url = args.url
+    try:
+        if not url:
+            services = FakeServices(
+                transcripts=utterances,
+                entities_file=os.path.join(HERE, "entities.json"),
+                ha_faults=Faults.parse(args.ha_faults),
+                llm_faults=Faults.parse(args.llm_faults),
+                whisper_faults=Faults.parse(args.whisper_faults),
+                google_faults=Faults.parse(args.google_faults),
+            ).start()
+            environment = services.environment()
+            environment["INTENT_CACHE_FILE"] = os.path.join(workdir, "intent_cache.json")
+            # Start from entities.json, as the fake HA serves it, not a local snapshot
+            environment["ENTITY_STORE_FILE"] = os.path.join(workdir, "entities.db")
+            server = ServerUnderTest(environment, os.path.join(workdir, "server.log")).wait_ready()
+            url = server.url
+
+        scenarios = {"text": text_request, "audio": audio_request}
+        if args.scenario != "all":
+            scenarios = {args.scenario: scenarios[args.scenario]}
+
+        report = {"revision": git_revision(), "concurrency": args.concurrency, "scenarios": {}}
+        for name, build_request in scenarios.items():
+            print(f"[BENCH] {name}: {args.requests} requests at concurrency {args.concurrency}...")
+            results = run_load(url, build_request, args.requests, args.concurrency, args.warmup)
+            report["scenarios"][name] = summarize(*results)
+        report["server"] = scrape_quantiles(url)
+        if services:
+            report["fakes"] = services.stats()
+    finally:
+        if server:
+            server.stop()
+            print(f"[BENCH] Server log: {os.path.join(workdir, 'server.log')}")
+        if services:
+            services.stop()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+import numpy as np
+from audio_preprocess import decode_wav, frame_rms
+
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW", "1.5"))
+DEDUP_SETTLE = float(os.getenv("DEDUP_SETTLE", "0.4"))
+ENVELOPE_MS = 50
+MAX_LAG_MS = 600            # how far apart two mics may start recording the same utterance
+MIN_CORRELATION = 0.8
+MIN_OVERLAP = 0.7
+
+
+class AudioFingerprint:
+    """Coarse loudness envelope of a clip, comparable across microphones
+
+    Different mics never produce the same bytes for one utterance, but the
+    shape of its loudness over time survives gain, noise and a few hundred
+    milliseconds of offset. `level` (peak over noise floor) says how well
+    placed the microphone was.
+    """
+
+    __slots__ = ("envelope", "level", "duration")
+
+    def __init__(self, envelope, level, duration):
+        self.envelope = envelope
+        self.level = level
+        self.duration = duration
+
+    def similar(self, other):
+        shorter = min(len(self.envelope), len(other.envelope))
+        if not shorter or not 0.5 <= self.duration / max(other.duration, 1e-6) <= 2.0:
+            return False
+        max_lag = MAX_LAG_MS // ENVELOPE_MS
+        a, b = self.envelope, other.envelope
+        for lag in range(-max_lag, max_lag + 1):
+            x = a[max(lag, 0):]
+            y = b[max(-lag, 0):]
+            n = min(len(x), len(y))
+            if n < MIN_OVERLAP * shorter or n < 4:
+                continue
+            x, y = x[:n] - x[:n].mean(), y[:n] - y[:n].mean()
+            norm = np.sqrt(np.dot(x, x) * np.dot(y, y))
+            if norm and np.dot(x, y) / norm >= MIN_CORRELATION:
+                return True
+        return False
+
+
+def audio_fingerprint(audio_data):
+    """AudioFingerprint of WAV bytes, or None if they can't be decoded"""
+    try:
+        samples, rate = decode_wav(audio_data)
+    except Exception:
+        return None
+    energies, frame = frame_rms(samples, rate)
+    if not len(energies):
+        return None
+    # Average frame_rms frames up to ENVELOPE_MS, in dB so mic gain only shifts it
+    group = max(int(ENVELOPE_MS * rate / 1000) // frame, 1)
+    usable = len(energies) // group * group
+    envelope = energies[:usable].reshape(-1, group).mean(axis=1) if usable else energies
+    envelope = 20 * np.log10(envelope + 1e-5)
+    floor = float(np.percentile(energies, 10)) + 1e-5
+    return AudioFingerprint(envelope, float(energies.max()) / floor, len(samples) / rate)
+
+
+class _Group:
+    __slots__ = ("key", "started", "devices", "best_device", "best_level",
+                 "done", "result", "error", "speech", "flushed", "lock")
+
+    def __init__(self, key, device, level, started):
+        self.key = key
+        self.started = started
+        self.devices = [device]
+        self.best_device = device
+        self.best_level = level
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.speech = []
+        self.flushed = False
+        self.lock = threading.Lock()
+
+    def join(self, device, level):
+        with self.lock:
+            self.devices.append(device)
+            # Without a level (text triggers) the first device to arrive keeps the reply
+            if level is not None and (self.best_level is None or level > self.best_level):
+                self.best_device, self.best_level = device, level
+
+
+class Coalescer:
+    """Run work once for requests that arrive together from different devices
+
+    The first request for a key leads and runs the work; requests with a
+    matching key from other devices within `window` seconds wait for the
+    leader and share its result. Keys match by equality, or by
+    key.similar(other) when the key provides it. Spoken replies from the
+    leader are held until `settle` seconds after it started, then sent with
+    speak(message, device) to the best-placed device heard so far.
+    """
+
+    def __init__(self, window=DEDUP_WINDOW, settle=DEDUP_SETTLE, speak=None, name="dedup"):
+        self.window = window
+        self.settle = settle
+        self.speak = speak
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._groups = []
+        self._lock = threading.Lock()
+
+    def _match(self, key, device, now):
+        self._groups = [g for g in self._groups if now - g.started < self.window]
+        for group in self._groups:
+            if device in group.devices:
+                continue
+            if hasattr(key, "similar"):
+                if key.similar(group.key):
+                    return group
+            elif key == group.key:
+                return group
+        return None
+
+    def run(self, key, device, work, level=None):
+        """work(reply) for the leader; followers get the leader's result or error"""
+        now = time.monotonic()
+        with self._lock:
+            group = self._match(key, device, now) if key is not None else None
+            if group is None:
+                group = _Group(key, device, level, now)
+                if key is not None:
+                    self._groups.append(group)
+                self.leaders += 1
+                leader = True
+            else:
+                group.join(device, level)
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            print(f"[{self.name.upper()}] {device} joined request from {group.devices[0]}")
+            group.done.wait()
+            if group.error is not None:
+                raise group.error
+            return group.result
+
+        try:
+            group.result = work(lambda message: self._reply(group, message))
+            return group.result
+        except Exception as e:
+            group.error = e
+            raise
+        finally:
+            group.done.set()
+
+    def _reply(self, group, message):
+        with group.lock:
+            if group.flushed:
+                self.speak(message, group.best_device)
+                return
+            group.speech.append(message)
+            if len(group.speech) > 1:
+                return
+        delay = group.started + self.settle - time.monotonic()
+        if delay > 0:
+            timer = threading.Timer(delay, self._flush, (group,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._flush(group)
+
+    def _flush(self, group):
+        with group.lock:
+            group.flushed = True
+            for message in group.speech:
+                self.speak(message, group.best_device)
+            group.speech = []
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced}
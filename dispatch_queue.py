@@ -0,0 +1,148 @@
+import time
+import threading
+from collections import deque, OrderedDict
+
+
+class _Task:
+    __slots__ = ("fn", "args", "merge", "queued_at")
+
+    def __init__(self, fn, args, merge):
+        self.fn = fn
+        self.args = args
+        self.merge = merge
+        self.queued_at = time.monotonic()
+
+
+class DispatchQueue:
+    """Bounded background queue for side effects that replies shouldn't wait on
+
+    Tasks that share a key (e.g. a speaker entity) run strictly in order and
+    never overlap; different keys run in parallel on the worker threads.
+    When a task is submitted with merge=fn and the key already has a task
+    waiting, the two are combined into one via fn(old_args, new_args).
+    Once `max_pending` tasks are waiting, the oldest waiting task is dropped
+    (policy "drop_oldest") or the new one is refused (policy "drop_new").
+    """
+
+    def __init__(self, workers=4, max_pending=64, policy="drop_oldest", name="dispatch"):
+        self.max_pending = max_pending
+        self.policy = policy
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.merged = 0
+        self._queues = OrderedDict()   # key -> deque of waiting tasks
+        self._ready = deque()          # keys with waiting tasks and no running task
+        self._running = set()
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, fn, *args, merge=None):
+        """Queue fn(*args) behind earlier tasks for key; False if it was refused"""
+        with self._cond:
+            if self._closed:
+                return False
+            self.submitted += 1
+            waiting = self._queues.get(key)
+
+            if merge and waiting and waiting[-1].merge is merge:
+                last = waiting[-1]
+                last.args = merge(last.args, args)
+                self.merged += 1
+                return True
+
+            if self._pending >= self.max_pending:
+                if self.policy == "drop_new" or not self._drop_oldest():
+                    self.dropped += 1
+                    return False
+                # The dropped task may have been the last one waiting for this key
+                waiting = self._queues.get(key)
+
+            if waiting is None:
+                waiting = self._queues[key] = deque()
+            waiting.append(_Task(fn, args, merge))
+            self._pending += 1
+            if key not in self._running and len(waiting) == 1:
+                self._ready.append(key)
+            self._cond.notify()
+            return True
+
+    def _drop_oldest(self):
+        oldest_key, oldest = None, None
+        for key, waiting in self._queues.items():
+            if waiting and (oldest is None or waiting[0].queued_at < oldest.queued_at):
+                oldest_key, oldest = key, waiting[0]
+        if oldest is None:
+            return False
+        self._queues[oldest_key].popleft()
+        self._pending -= 1
+        self.dropped += 1
+        if not self._queues[oldest_key]:
+            del self._queues[oldest_key]
+            if oldest_key in self._ready:
+                self._ready.remove(oldest_key)
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or (self._closed and not self._pending))
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                task = self._queues[key].popleft()
+                if not self._queues[key]:
+                    del self._queues[key]
+                self._pending -= 1
+                self._running.add(key)
+
+            try:
+                task.fn(*task.args)
+                ok = True
+            except Exception as e:
+                print(f"[DISPATCH] Task for {key} failed: {e}")
+                ok = False
+
+            with self._cond:
+                self._running.discard(key)
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                if key in self._queues:
+                    self._ready.append(key)
+                self._cond.notify_all()
+
+    def drain(self, timeout=None):
+        """Wait until nothing is queued or running"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def shutdown(self, timeout=10):
+        """Stop accepting work, finish what is queued, then stop the workers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        return self.drain(0)
+
+    def stats(self):
+        return {
+            "pending": self._pending,
+            "running": len(self._running),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "merged": self.merged,
+        }
@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import defaultdict
+from entity_store import get_entity_store
+
+ENTITIES_FILE = os.getenv("ENTITIES_FILE", "entities.json")
+
+# Domains that accept turn_on/turn_off style voice control
+CONTROLLABLE_DOMAINS = {
+    "light", "switch", "fan", "cover", "lock", "climate", "media_player",
+    "script", "scene", "input_boolean", "vacuum", "siren", "automation",
+}
+
+# Room words used to group entities by area (HA states carry no area_id)
+ROOM_WORDS = {
+    "kitchen", "conservatory", "bathroom", "ensuite", "bedroom", "living",
+    "dining", "hallway", "landing", "entrance", "garden", "gate", "driveway",
+    "patio", "deck", "decking", "porch", "workshop", "shed", "garage",
+    "office", "spare", "upstairs", "downstairs",
+}
+
+# Spoken/abbreviated forms mapped onto the canonical token
+TOKEN_ALIASES = {
+    "conserv": "conservatory",
+    "lamp": "light",
+    "lounge": "living",
+    "hall": "hallway",
+    "rad": "radiator",
+    "socket": "plug",
+}
+
+# Words that hint at the target domain without naming a device
+DOMAIN_HINTS = {
+    "light": ("light", "switch"),
+    "switch": ("switch",),
+    "plug": ("switch",),
+    "heating": ("climate",),
+    "thermostat": ("climate",),
+    "radiator": ("climate",),
+    "speaker": ("media_player",),
+    "music": ("media_player",),
+    "fan": ("fan",),
+    "lock": ("lock",),
+    "curtain": ("cover",),
+    "blind": ("cover",),
+    "vacuum": ("vacuum",),
+    "siren": ("siren",),
+}
+
+# Tokens marking a helper entity hanging off a real device (e.g. a backlight)
+AUXILIARY_TOKENS = {
+    "backlight", "child", "led", "crossfade", "loudness", "snapshot",
+    "standby", "dnd", "overtemp", "config", "alarm", "remote", "access",
+    "enabled", "update", "chime", "listen", "mic",
+}
+
+STOP_WORDS = {
+    "the", "a", "an", "on", "off", "turn", "please", "to", "in", "my", "is",
+    "of", "and", "set", "jarvis", "hey", "what", "it", "can", "you", "are",
+    "all", "up", "down", "for", "me",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _singular(token):
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Split text into normalized, singular, alias-resolved tokens"""
+    text = text.lower().replace("en-suite", "ensuite").replace("en suite", "ensuite")
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        token = _singular(token)
+        tokens.append(TOKEN_ALIASES.get(token, token))
+    return tokens
+
+
+def entity_name(entity):
+    """Friendly name of an entity, falling back to its object_id"""
+    name = (entity.get("attributes") or {}).get("friendly_name")
+    if not name:
+        name = entity["entity_id"].split(".", 1)[1].replace("_", " ")
+    return " ".join(name.split())
+
+
+class EntityRegistry:
+    """In-memory entity snapshot with lookup indexes for fast resolution"""
+
+    def __init__(self, entities=None):
+        self._lock = threading.RLock()
+        self.version = 0
+        self._build(entities or [])
+
+    def _build(self, entities):
+        by_id = {}
+        by_domain = defaultdict(list)
+        by_token = defaultdict(set)
+        by_area = defaultdict(list)
+        area_of = {}
+        names = {}
+        name_tokens = {}
+
+        for entity in entities:
+            entity_id = entity.get("entity_id")
+            if not entity_id or "." not in entity_id:
+                continue
+            domain, object_id = entity_id.split(".", 1)
+            name = entity_name(entity)
+            tokens = set(tokenize(name)) | set(tokenize(object_id))
+
+            by_id[entity_id] = entity
+            by_domain[domain].append(entity_id)
+            names[entity_id] = name
+            name_tokens[entity_id] = tokens
+            for token in tokens:
+                by_token[token].add(entity_id)
+
+            area = next((t for t in tokenize(name) if t in ROOM_WORDS), None)
+            if area is None:
+                area = next((t for t in tokenize(object_id) if t in ROOM_WORDS), None)
+            if area:
+                by_area[area].append(entity_id)
+                area_of[entity_id] = area
+
+        total = max(len(by_id), 1)
+        idf = {token: math.log(1 + total / len(ids)) for token, ids in by_token.items()}
+        digest = hashlib.sha1()
+        for entity_id in sorted(names):
+            digest.update(f"{entity_id}={names[entity_id]}\n".encode())
+
+        with self._lock:
+            self.by_id = by_id
+            self.by_domain = dict(by_domain)
+            self.by_token = dict(by_token)
+            self.by_area = dict(by_area)
+            self.area_of = area_of
+            self.names = names
+            self.name_tokens = name_tokens
+            self.idf = idf
+            self.fingerprint = digest.hexdigest()
+            self.version += 1
+
+    def load(self, path=ENTITIES_FILE):
+        """Load and index an entities.json snapshot from disk"""
+        try:
+            with open(path, "r") as f:
+                entities = json.load(f)
+        except Exception as e:
+            print(f"[ERROR] Could not load {path}: {e}")
+            entities = []
+        self._build(entities)
+        print(f"[REGISTRY] Indexed {len(self.by_id)} entities from {path}")
+        return self
+
+    def load_store(self, store):
+        """Load and index the SQLite snapshot kept by fetch_entities"""
+        self._build(store.load())
+        print(f"[REGISTRY] Indexed {len(self.by_id)} entities from {store.path}")
+        return self
+
+    def replace(self, entities):
+        """Re-index the registry from a fresh list of entity states"""
+        self._build(entities)
+
+    @property
+    def entities(self):
+        return list(self.by_id.values())
+
+    def apply(self, entity_id, new_state):
+        """Patch one entity from a state_changed event, re-indexing only on renames"""
+        with self._lock:
+            old_state = self.by_id.get(entity_id)
+            if new_state is None:
+                if old_state is None:
+                    return
+                entities = [e for e in self.by_id.values() if e["entity_id"] != entity_id]
+                self._build(entities)
+                return
+            if old_state is None or entity_name(old_state) != entity_name(new_state):
+                entities = [e for e in self.by_id.values() if e["entity_id"] != entity_id]
+                entities.append(new_state)
+                self._build(entities)
+                return
+            self.by_id[entity_id] = new_state
+
+    def state(self, entity_id):
+        entity = self.by_id.get(entity_id)
+        return entity.get("state") if entity else None
+
+    def get(self, entity_id):
+        return self.by_id.get(entity_id)
+
+    def domain(self, domain):
+        return [self.by_id[e] for e in self.by_domain.get(domain, [])]
+
+    def area(self, room):
+        room = TOKEN_ALIASES.get(room.lower(), room.lower())
+        return [self.by_id[e] for e in self.by_area.get(room, [])]
+
+    def resolve(self, text, domains=None, limit=5):
+        """Rank entities whose names match the words in text"""
+        query = [t for t in tokenize(text) if t not in STOP_WORDS]
+        if not query:
+            return []
+
+        query_set = set(query)
+        hinted = set()
+        for token in query:
+            hinted.update(DOMAIN_HINTS.get(token, ()))
+        rooms = query_set & ROOM_WORDS
+
+        with self._lock:
+            by_token, idf = self.by_token, self.idf
+            scores = defaultdict(float)
+            for token in query_set:
+                weight = idf.get(token)
+                if weight is None:
+                    continue
+                for entity_id in by_token[token]:
+                    scores[entity_id] += weight
+
+            candidates = []
+            for entity_id, score in scores.items():
+                domain = entity_id.split(".", 1)[0]
+                if domains and domain not in domains:
+                    continue
+                if hinted:
+                    score += 0.5 if domain in hinted else -1.0
+                if rooms and self.area_of.get(entity_id) in rooms:
+                    score += 1.0
+                extra = (self.name_tokens[entity_id] & AUXILIARY_TOKENS) - query_set
+                score -= 2.0 * len(extra)
+                if score <= 0:
+                    continue
+                candidates.append({
+                    "entity_id": entity_id,
+                    "name": self.names[entity_id],
+                    "domain": domain,
+                    "area": self.area_of.get(entity_id),
+                    "tokens": self.name_tokens[entity_id],
+                    "score": round(score, 3),
+                })
+
+        # Read the indexes only under the lock; a rebuild may swap them at any time
+        candidates.sort(key=lambda c: (-c["score"], len(c["tokens"])))
+        return candidates[:limit]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Shared registry, loaded on first use from the entity store, else entities.json"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = _load_snapshot(EntityRegistry())
+    return _registry
+
+
+def _load_snapshot(registry):
+    store = get_entity_store()
+    return registry.load_store(store) if store.exists() else registry.load()
+
+
+def reload_registry(entities=None):
+    """Refresh the shared registry from a new snapshot or from disk"""
+    registry = get_registry()
+    if entities is None:
+        _load_snapshot(registry)
+    else:
+        registry.replace(entities)
+    return registry
+
+
+def resolve(text, domains=None, limit=5):
+    return get_registry().resolve(text, domains=domains, limit=limit)
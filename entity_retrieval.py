@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from entity_registry import (
+    get_registry, tokenize, entity_name, CONTROLLABLE_DOMAINS, DOMAIN_HINTS, STOP_WORDS,
+)
+
+TOP_K = int(os.getenv("GPT_TOP_K", "15"))
+EVAL_FILE = "retrieval_eval.json"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+NGRAM_WEIGHT = 0.3
+
+# Extra words appended to each document so "heating" finds climate entities etc.
+DOMAIN_WORDS = {}
+for _word, _domains in DOMAIN_HINTS.items():
+    for _domain in _domains:
+        DOMAIN_WORDS.setdefault(_domain, []).append(_word)
+
+
+def char_ngrams(token, n=3):
+    padded = f"#{token}#"
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def _features(tokens):
+    """Word terms plus character trigrams (prefixed so they never clash)"""
+    features = list(tokens)
+    for token in tokens:
+        features.extend("~" + g for g in char_ngrams(token))
+    return features
+
+
+class EntityRetriever:
+    """BM25 + char-trigram ranking of controllable entities against an utterance
+
+    The BM25 weight of every (entity, term) pair is precomputed into a dense
+    matrix, so scoring a query is a column sum plus an argpartition.
+    """
+
+    def __init__(self, entities, domains=CONTROLLABLE_DOMAINS):
+        docs = []
+        self.entity_ids = []
+        self.names = []
+        for entity in entities:
+            entity_id = entity["entity_id"]
+            domain, object_id = entity_id.split(".", 1)
+            if domains and domain not in domains:
+                continue
+            name = entity_name(entity)
+            tokens = tokenize(name) + tokenize(object_id) + tokenize(domain)
+            tokens += DOMAIN_WORDS.get(domain, [])
+            docs.append(_features(tokens))
+            self.entity_ids.append(entity_id)
+            self.names.append(name)
+
+        vocab = {}
+        for doc in docs:
+            for term in doc:
+                vocab.setdefault(term, len(vocab))
+        self.vocab = vocab
+
+        tf = np.zeros((len(docs), max(len(vocab), 1)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for term in doc:
+                tf[row, vocab[term]] += 1
+
+        lengths = tf.sum(axis=1, keepdims=True)
+        avg_length = float(lengths.mean()) if len(docs) else 1.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_length, 1e-9))
+        weights = idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        term_scale = np.array(
+            [NGRAM_WEIGHT if term.startswith("~") else 1.0 for term in vocab], dtype=np.float32
+        ) if vocab else np.ones(1, dtype=np.float32)
+        self.weights = np.ascontiguousarray((weights * term_scale).T, dtype=np.float32)
+
+    def retrieve(self, text, k=TOP_K):
+        """Top-k (entity_id, name, score) tuples for an utterance"""
+        if not self.entity_ids:
+            return []
+        tokens = [t for t in tokenize(text) if t not in STOP_WORDS]
+        columns = [self.vocab[f] for f in _features(tokens) if f in self.vocab]
+        if not columns:
+            return []
+
+        scores = self.weights[columns].sum(axis=0)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (self.entity_ids[i], self.names[i], float(scores[i]))
+            for i in top if scores[i] > 0
+        ]
+
+
+_retriever = None
+_retriever_version = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    """Shared retriever, rebuilt whenever the registry is re-indexed"""
+    global _retriever, _retriever_version
+    registry = get_registry()
+    if _retriever is None or _retriever_version != registry.version:
+        with _retriever_lock:
+            if _retriever is None or _retriever_version != registry.version:
+                _retriever = EntityRetriever(registry.entities)
+                _retriever_version = registry.version
+    return _retriever
+
+
+def retrieve_candidates(text, entities=None, k=TOP_K):
+    """Entities worth showing the LLM for this utterance"""
+    retriever = get_retriever() if entities is None else EntityRetriever(entities)
+    return retriever.retrieve(text, k=k)
+
+
+def recall_at_k(labelled, k=TOP_K, retriever=None):
+    """Fraction of labelled utterances whose expected entity is in the top k"""
+    retriever = retriever or get_retriever()
+    hits = 0
+    misses = []
+    for example in labelled:
+        found = {entity_id for entity_id, _, _ in retriever.retrieve(example["text"], k=k)}
+        if example["entity"] in found:
+            hits += 1
+        else:
+            misses.append(example)
+    return (hits / len(labelled) if labelled else 0.0), misses
+
+
+if __name__ == "__main__":
+    with open(EVAL_FILE, "r") as f:
+        labelled = json.load(f)
+
+    retriever = get_retriever()
+    print(f"Indexed {len(retriever.entity_ids)} controllable entities, {len(retriever.vocab)} terms")
+
+    for k in (1, 5, TOP_K):
+        recall, misses = recall_at_k(labelled, k=k, retriever=retriever)
+        print(f"recall@{k}: {recall:.2%} ({len(labelled) - len(misses)}/{len(labelled)})")
+    for example in misses:
+        print(f"  missed: '{example['text']}' -> {example['entity']}")
+
+    runs = 2000
+    start = time.perf_counter()
+    for i in range(runs):
+        retriever.retrieve(labelled[i % len(labelled)]["text"])
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"Mean retrieval latency: {elapsed * 1e6:.0f} us")
@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+STORE_FILE = os.getenv("ENTITY_STORE_FILE", "entities.db")
+MMAP_SIZE = 64 * 1024 * 1024    # reads come straight from the page cache
+
+SCHEMA_VERSION = 3
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    entity_id TEXT PRIMARY KEY,
+    domain TEXT NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entities_domain ON entities (domain);
+"""
+
+
+# What the registry reads from a state; the rest of the attributes stay in HA
+STORED_FIELDS = ("entity_id", "state", "last_changed", "last_updated")
+STORED_ATTRIBUTES = ("friendly_name",)
+
+
+def _compact(entity):
+    attributes = entity.get("attributes") or {}
+    stored = {field: entity.get(field) for field in STORED_FIELDS}
+    stored["attributes"] = {key: attributes[key] for key in STORED_ATTRIBUTES if key in attributes}
+    return json.dumps(stored, separators=(",", ":"), ensure_ascii=False)
+
+
+def _version(entity):
+    return entity.get("last_changed"), entity.get("last_updated")
+
+
+class EntityStore:
+    """SQLite snapshot of entity states, refreshed incrementally
+
+    One compact JSON row per entity, keyed by entity_id and indexed by
+    domain, holding only the fields the registry reads (STORED_FIELDS and
+    STORED_ATTRIBUTES); rows stay queryable with json_extract(). sync()
+    compares each entity's last_changed/last_updated with the stored snapshot
+    and only rewrites the rows that differ, so a refresh costs the number of
+    changed entities rather than all of them.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self._versions = None   # entity_id -> (last_changed, last_updated) of the stored row
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                # Older layouts are only a cache of HA's states; the next sync refills it
+                conn.executescript(f"DROP TABLE IF EXISTS entities; PRAGMA user_version = {SCHEMA_VERSION};")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def exists(self):
+        """True once a snapshot has been written"""
+        if not os.path.exists(self.path):
+            return False
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM entities LIMIT 1").fetchone() is not None
+
+    def load(self):
+        """Every stored entity state, decoded in one pass"""
+        with self._lock:
+            return self._load(self._connection())
+
+    def _load(self, conn):
+        # One json.loads over the concatenated rows beats one call per row
+        row = conn.execute("SELECT '[' || group_concat(data, ',') || ']' FROM entities").fetchone()
+        entities = json.loads(row[0]) if row[0] else []
+        self._versions = {e["entity_id"]: _version(e) for e in entities}
+        return entities
+
+    def _stored_versions(self, conn):
+        if self._versions is None:
+            self._load(conn)
+        return self._versions
+
+    def sync(self, entities):
+        """Write the entities whose state differs from the stored snapshot
+
+        Entities missing from `entities` are deleted. Returns counts of
+        added, changed, removed and unchanged entities.
+        """
+        with self._lock:
+            conn = self._connection()
+            stored = self._stored_versions(conn)
+            seen = set()
+            rows = []
+            added = 0
+            for entity in entities:
+                entity_id = entity.get("entity_id")
+                if not entity_id or "." not in entity_id:
+                    continue
+                seen.add(entity_id)
+                version = _version(entity)
+                previous = stored.get(entity_id)
+                if previous == version:
+                    continue
+                if previous is None:
+                    added += 1
+                rows.append((entity_id, entity_id.split(".", 1)[0], _compact(entity), version))
+            removed = [(entity_id,) for entity_id in stored if entity_id not in seen]
+
+            if rows or removed:
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO entities VALUES (?, ?, ?)",
+                                     [row[:3] for row in rows])
+                    conn.executemany("DELETE FROM entities WHERE entity_id = ?", removed)
+                for entity_id, _, _, version in rows:
+                    stored[entity_id] = version
+                for (entity_id,) in removed:
+                    del stored[entity_id]
+
+            return {
+                "added": added,
+                "changed": len(rows) - added,
+                "removed": len(removed),
+                "unchanged": len(seen) - len(rows),
+            }
+
+    def get(self, entity_id):
+        with self._lock:
+            row = self._connection().execute("SELECT data FROM entities WHERE entity_id = ?", (entity_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def domain(self, domain):
+        with self._lock:
+            rows = self._connection().execute("SELECT data FROM entities WHERE domain = ?", (domain,)).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def summary(self):
+        """entity_id, name and domain of every entity (what entities_summary.json held)"""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT entity_id, json_extract(data, '$.attributes.friendly_name'), domain "
+                "FROM entities ORDER BY entity_id"
+            ).fetchall()
+        return [{"entity_id": entity_id, "name": name or "", "domain": domain} for entity_id, name, domain in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                # Fold the write-ahead log back in so the .db file is the whole snapshot
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.close()
+                self._conn = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_entity_store():
+    """Shared store at ENTITY_STORE_FILE"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = EntityStore()
+    return _store
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "entities.json"
+    with open(source) as f:
+        entities = json.load(f)
+    runs = 20
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        return (time.perf_counter() - start) / runs * 1000
+
+    def churn(entities, fraction, seed):
+        """Copy of entities with `fraction` of the sensors given a new last_updated"""
+        rng = random.Random(seed)
+        sensors = [i for i, e in enumerate(entities) if e["entity_id"].startswith("sensor.")]
+        updated = list(entities)
+        for i in rng.sample(sensors, int(len(sensors) * fraction)):
+            updated[i] = dict(entities[i], last_updated=f"2026-01-01T00:00:{seed % 60:02d}.{i:06d}+00:00")
+        return updated
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "entities.json")
+        store = EntityStore(os.path.join(tmp, "entities.db"))
+
+        def json_refresh():
+            with open(json_path, "w") as f:
+                json.dump(entities, f, indent=2)
+
+        def json_load():
+            with open(json_path) as f:
+                json.load(f)
+
+        json_write_ms = timed(json_refresh)
+        json_load_ms = timed(json_load)
+
+        start = time.perf_counter()
+        store.sync(entities)
+        import_ms = (time.perf_counter() - start) * 1000
+        store_load_ms = timed(lambda: EntityStore(store.path).load())
+        unchanged_ms = timed(lambda: store.sync(entities))
+        snapshots = iter(churn(entities, 0.05, seed) for seed in range(1, runs + 1))
+        changes = {}
+        churn_ms = timed(lambda: changes.update(store.sync(next(snapshots))))
+
+        store.close()
+        store_bytes = os.path.getsize(store.path)
+
+        print(f"{len(entities)} entities")
+        print(f"JSON (indent=2): {os.path.getsize(json_path):,} bytes, "
+              f"refresh {json_write_ms:.2f} ms, load {json_load_ms:.2f} ms")
+        print(f"SQLite store:    {store_bytes:,} bytes, initial import {import_ms:.2f} ms, "
+              f"load {store_load_ms:.2f} ms")
+        print(f"Refresh, nothing changed:   {unchanged_ms:.2f} ms")
+        print(f"Refresh, 5% sensors changed: {churn_ms:.2f} ms ({changes['changed']} rows written)")
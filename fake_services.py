@@ -0,0 +1,424 @@
+import os
+import sys
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import itertools
+import threading
+import socketserver
+from flask import Flask, Response, request, jsonify
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+
+class Faults:
+    """Latency and failure injection for one fake endpoint
+
+    Each request waits `latency` seconds plus up to `jitter` more, then fails
+    with `status` with probability `failure_rate`. The first `fail_first`
+    requests always fail, for testing retries deterministically.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, status=503, seed=0, fail_first=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.status = status
+        self.fail_first = fail_first
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec):
+        """'latency[,jitter[,failure_rate[,status]]]' in seconds, e.g. '0.05,0.02,0.1'"""
+        fields = [float(v) for v in spec.split(",")] if spec else []
+        if len(fields) > 3:
+            fields[3] = int(fields[3])
+        return cls(*fields)
+
+    def apply(self):
+        """Sleep, then return an error response to send instead, or None"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.failure_rate or self.requests <= self.fail_first
+            if failed:
+                self.failures += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return Response("injected failure", status=self.status)
+        return None
+
+    def stats(self):
+        return {"requests": self.requests, "failures": self.failures}
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class FakeServer:
+    """A Flask app served from a background thread on a free local port"""
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        self._server = make_server(host, port, app, threaded=True, request_handler=_QuietHandler)
+        self.url = f"http://{host}:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+
+def fake_home_assistant(entities_file="entities.json", faults=None, state_faults=None):
+    """HA REST stand-in: /api/states from entities_file, /api/services/* accept everything
+
+    Successful service calls are recorded in app.calls as (domain, service, payload).
+    """
+    faults = faults or Faults()
+    state_faults = state_faults or Faults()
+    with open(entities_file, "rb") as f:
+        states_body = f.read()
+    states = {entity["entity_id"]: entity for entity in json.loads(states_body)}
+    app = Flask("fake_home_assistant")
+    app.faults = {"services": faults, "states": state_faults}
+    app.calls = []
+
+    @app.get("/api/")
+    def api_root():
+        return jsonify({"message": "API running."})
+
+    @app.get("/api/states")
+    def all_states():
+        return state_faults.apply() or Response(states_body, mimetype="application/json")
+
+    @app.get("/api/states/<entity_id>")
+    def one_state(entity_id):
+        error = state_faults.apply()
+        if error:
+            return error
+        if entity_id not in states:
+            return jsonify({"message": "Entity not found."}), 404
+        return jsonify(states[entity_id])
+
+    @app.post("/api/services/<domain>/<service>")
+    def call_service(domain, service):
+        error = faults.apply()
+        if error:
+            return error
+        app.calls.append((domain, service, request.get_json(silent=True)))
+        return jsonify([])
+
+    return app
+
+
+def fake_openai(transcripts, faults=None, whisper_faults=None, chunk_delay=0.01):
+    """OpenAI stand-in for chat completions (plain and streamed) and Whisper
+
+    The chat reply targets the first candidate device in the prompt, so it
+    exercises the same parsing and dispatch path as the real model.
+    """
+    faults = faults or Faults()
+    whisper_faults = whisper_faults or Faults()
+    transcript_cycle = _cycle(transcripts)
+    app = Flask("fake_openai")
+    app.faults = {"chat": faults, "whisper": whisper_faults}
+
+    def reply_for(messages):
+        prompt = messages[-1]["content"] if messages else ""
+        devices = prompt.split("Available devices: ", 1)[-1].split(" (", 1)
+        entity = devices[0].strip() if len(devices) > 1 else "light.kitchen"
+        return json.dumps({
+            "entity": entity,
+            "intent": "turn_on",
+            "response": f"Okay, turning on {entity}. Anything else?",
+        })
+
+    @app.post("/v1/chat/completions")
+    def chat_completions():
+        error = faults.apply()
+        if error:
+            return error
+        body = request.get_json()
+        reply = reply_for(body.get("messages", []))
+        model = body.get("model", "gpt-4")
+
+        if not body.get("stream"):
+            return jsonify({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        def events():
+            for i in range(0, len(reply), 8):
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": reply[i:i + 8]}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if chunk_delay:
+                    time.sleep(chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return Response(events(), mimetype="text/event-stream")
+
+    @app.post("/v1/audio/transcriptions")
+    def transcriptions():
+        return whisper_faults.apply() or jsonify({"text": transcript_cycle()})
+
+    return app
+
+
+def fake_google_stt(transcripts, faults=None):
+    """Google Speech API v2 stand-in, answering in its two-line JSON format"""
+    faults = faults or Faults()
+    transcript_cycle = _cycle(transcripts)
+    app = Flask("fake_google_stt")
+    app.faults = {"recognize": faults}
+
+    @app.post("/speech-api/v2/recognize")
+    def recognize():
+        error = faults.apply()
+        if error:
+            return error
+        result = {"result": [{"alternative": [{"transcript": transcript_cycle(), "confidence": 0.9}],
+                              "final": True}], "result_index": 0}
+        return Response('{"result":[]}\n' + json.dumps(result) + "\n", mimetype="application/json")
+
+    return app
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class _WebSocketHandler(socketserver.StreamRequestHandler):
+    """Just enough RFC 6455 for text frames: handshake, unmasking, close"""
+
+    def handle(self):
+        key = None
+        while True:
+            line = self.rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "sec-websocket-key":
+                key = value.strip()
+        if key is None:
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.wfile.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        self.server.fake._session(self)
+
+    def send_json(self, message):
+        payload = json.dumps(message).encode()
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x81, len(payload))
+        elif len(payload) < 65536:
+            header = struct.pack("!BBH", 0x81, 126, len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x81, 127, len(payload))
+        with self.send_lock:
+            self.wfile.write(header + payload)
+
+    def recv_json(self):
+        """Next text message, or None once the client closes"""
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return None
+            opcode, length = header[0] & 0x0F, header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(length)))
+            if opcode == 0x8:
+                return None
+            if opcode == 0x1:
+                return json.loads(payload)
+
+
+class _WebSocketServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeHAWebSocket:
+    """HA WebSocket API stand-in for state_mirror.StateMirror
+
+    Serves auth, subscribe_events and get_states from entities_file.
+    push() changes an entity and sends state_changed to subscribers, and
+    drop() cuts every connection to exercise reconnects. Clearing
+    answer_pings makes the server go silent like a half-open connection.
+    """
+
+    def __init__(self, entities_file="entities.json", token="benchmark", host="127.0.0.1", port=0):
+        with open(entities_file) as f:
+            self.states = {entity["entity_id"]: entity for entity in json.load(f)}
+        self.token = token
+        self.connections = 0
+        self.pings = 0
+        self.answer_pings = True
+        self._clients = set()
+        self._subscribers = {}      # client -> subscription id
+        self._lock = threading.Lock()
+        self._server = _WebSocketServer((host, port), _WebSocketHandler)
+        self._server.fake = self
+        self.url = f"ws://{host}:{self._server.server_address[1]}/api/websocket"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self.drop()
+        self._server.server_close()
+
+    def _session(self, client):
+        client.send_lock = threading.Lock()
+        with self._lock:
+            self.connections += 1
+            self._clients.add(client)
+        try:
+            client.send_json({"type": "auth_required", "ha_version": "2025.6.0"})
+            auth = client.recv_json()
+            if not auth or auth.get("access_token") != self.token:
+                client.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+                return
+            client.send_json({"type": "auth_ok", "ha_version": "2025.6.0"})
+            while True:
+                message = client.recv_json()
+                if message is None:
+                    return
+                if message.get("type") == "subscribe_events":
+                    with self._lock:
+                        self._subscribers[client] = message["id"]
+                    client.send_json({"id": message["id"], "type": "result", "success": True, "result": None})
+                elif message.get("type") == "get_states":
+                    with self._lock:
+                        states = list(self.states.values())
+                    client.send_json({"id": message["id"], "type": "result", "success": True, "result": states})
+                elif message.get("type") == "ping":
+                    self.pings += 1
+                    if self.answer_pings:
+                        client.send_json({"id": message["id"], "type": "pong"})
+                else:
+                    client.send_json({"id": message.get("id"), "type": "result", "success": False,
+                                      "error": {"code": "unknown_command", "message": "Unknown command."}})
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._clients.discard(client)
+                self._subscribers.pop(client, None)
+
+    def push(self, entity_id, new_state, notify=True):
+        """Set an entity's state (None removes it) and send state_changed to subscribers"""
+        with self._lock:
+            old_state = self.states.pop(entity_id, None)
+            if new_state is not None:
+                self.states[entity_id] = new_state
+            subscribers = list(self._subscribers.items()) if notify else []
+        for client, subscription in subscribers:
+            event = {"event_type": "state_changed",
+                     "data": {"entity_id": entity_id, "old_state": old_state, "new_state": new_state}}
+            try:
+                client.send_json({"id": subscription, "type": "event", "event": event})
+            except OSError:
+                pass
+
+    def drop(self):
+        """Close every open connection, as HA does when it restarts"""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def _cycle(items):
+    """Thread-safe round robin over items"""
+    items = itertools.cycle(list(items) or ["turn on the kitchen light"])
+    lock = threading.Lock()
+
+    def take():
+        with lock:
+            return next(items)
+
+    return take
+
+
+class FakeServices:
+    """Home Assistant, OpenAI and Google STT stand-ins running together"""
+
+    def __init__(self, transcripts=(), entities_file="entities.json", ha_faults=None, llm_faults=None,
+                 whisper_faults=None, google_faults=None, chunk_delay=0.01):
+        self.apps = {
+            "ha": fake_home_assistant(entities_file, ha_faults),
+            "openai": fake_openai(transcripts, llm_faults, whisper_faults, chunk_delay),
+            "google": fake_google_stt(transcripts, google_faults),
+        }
+        self.servers = {}
+
+    def start(self):
+        for name, app in self.apps.items():
+            self.servers[name] = FakeServer(app).start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.stop()
+
+    def environment(self):
+        """Environment variables that point main.py at these fakes"""
+        return {
+            "HA_URL": self.servers["ha"].url,
+            "HA_TOKEN": "benchmark",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{self.servers['openai'].url}/v1",
+            "GOOGLE_STT_ENDPOINT": f"{self.servers['google'].url}/speech-api/v2/recognize",
+        }
+
+    def stats(self):
+        return {
+            f"{name}.{endpoint}": faults.stats()
+            for name, app in self.apps.items()
+            for endpoint, faults in app.faults.items()
+        }
+
+
+if __name__ == "__main__":
+    # Run the fakes standalone, e.g. to point a manually started main.py at them
+    services = FakeServices(
+        transcripts=sys.argv[1:],
+        ha_faults=Faults.parse(os.getenv("FAKE_HA_FAULTS", "")),
+        llm_faults=Faults.parse(os.getenv("FAKE_LLM_FAULTS", "")),
+        whisper_faults=Faults.parse(os.getenv("FAKE_WHISPER_FAULTS", "")),
+        google_faults=Faults.parse(os.getenv("FAKE_GOOGLE_FAULTS", "")),
+    ).start()
+    for key, value in services.environment().items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
@@ -1,7 +1,8 @@
 import os
-import json
 import requests
 from dotenv import load_dotenv
+from entity_registry import reload_registry, get_registry
+from entity_store import get_entity_store
 
 load_dotenv()
 
@@ -21,25 +22,26 @@ def fetch_entities():
     response = requests.get(url, headers=HEADERS)
     if response.status_code == 200:
         entities = response.json()
-        with open("entities.json", "w") as f:
-            json.dump(entities, f, indent=2)
+        # Only entities whose last_changed/last_updated moved are rewritten
+        store = get_entity_store()
+        changes = store.sync(entities)
+        if changes["added"] or changes["changed"] or changes["removed"]:
+            reload_registry(entities)
         from datetime import datetime
-        entities_summary = [{"entity_id": e["entity_id"], "name": e["attributes"].get("friendly_name", ""), "domain": e["entity_id"].split(".")[0]} for e in entities]
-        with open("entities_summary.json", "w") as f_summary:
-            json.dump(entities_summary, f_summary, indent=2)
-        print(f"✅ Saved {len(entities)} entities to entities.json")
-        print(f"✅ Summary saved to entities_summary.json at {datetime.now()}")
+        print(f"✅ Synced {len(entities)} entities to {store.path} at {datetime.now()}: "
+              f"{changes['added']} added, {changes['changed']} changed, {changes['removed']} removed")
     else:
         print(f"❌ Failed to fetch entities: {response.status_code} - {response.text}")
 
-# Utility function to load all entities from entities.json
+# Utility function to get all entities from the in-memory registry
 def get_all_entities():
-    try:
-        with open("entities.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"[ERROR] Could not load entities.json: {e}")
-        return []
+    """Entity states as the registry holds them
+
+    After a restart these are the entity store's trimmed records (entity_id,
+    state, friendly_name and the last_* stamps); fetch /api/states when the
+    full attributes are needed.
+    """
+    return get_registry().entities
 
 if __name__ == "__main__":
-    fetch_entities()
\ No newline at end of file
+    fetch_entities()
@@ -1,8 +1,12 @@
 import os
+import re
 import json
 import traceback
 from openai import OpenAI
 from dotenv import load_dotenv
+from entity_retrieval import retrieve_candidates
+from intent_cache import get_intent_cache
+from stream_parser import IncrementalJSONParser
 
 load_dotenv()
 
@@ -10,9 +14,17 @@ client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY")
 )
 
-def ask_gpt(text, entities):
-    entity_names = [e["entity_id"] for e in entities]
-    prompt = (
+GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4")
+SYSTEM_PROMPT = "You help interpret smart home voice commands."
+
+# A sentence ends at . ! or ? followed by whitespace
+SENTENCE_END = re.compile(r"[.!?]\s")
+
+def build_prompt(text, entities=None):
+    # Only the top-k entities that lexically match the utterance go into the prompt
+    candidates = retrieve_candidates(text, entities)
+    entity_names = [f"{entity_id} ({name})" for entity_id, name, _ in candidates]
+    return (
         f"You are a smart home assistant. The user said: '{text}'. "
         f"Available devices: {', '.join(entity_names)}.\n\n"
         f"Respond with a JSON object like this:\n"
@@ -20,21 +32,114 @@ def ask_gpt(text, entities):
         f"Only include known entities."
     )
 
+def ask_gpt(text, entities=None):
+    cache = get_intent_cache()
+    cached = cache.get(text)
+    if cached:
+        return cached
+
+    prompt = build_prompt(text, entities)
+
     try:
         chat_response = client.chat.completions.create(
-            model="gpt-4",
+            model=GPT_MODEL,
             messages=[
-                {"role": "system", "content": "You help interpret smart home voice commands."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3
         )
 
         reply = chat_response.choices[0].message.content
-        return json.loads(reply)
+        result = json.loads(reply)
+        cache.put(text, result)
+        return result
+    except Exception as e:
+        return {
+            "response": f"Failed to understand the command: {str(e)}",
+            "debug_prompt": prompt,
+            "traceback": traceback.format_exc()
+        }
+
+def ask_gpt_stream(text, on_intent=None, on_speech=None, entities=None):
+    """Like ask_gpt, but streams the completion and acts on it as it arrives.
+
+    on_intent(entity, intent) fires as soon as both fields are parsed, before
+    the model has finished writing the response. on_speech(sentence) fires for
+    each completed sentence of the response text.
+    """
+    cache = get_intent_cache()
+    cached = cache.get(text)
+    if cached:
+        if on_intent:
+            on_intent(cached["entity"], cached["intent"])
+        if on_speech and cached.get("response"):
+            on_speech(cached["response"])
+        return cached
+
+    prompt = build_prompt(text, entities)
+    dispatched = False
+    speech = ""
+
+    def flush_speech(final=False):
+        nonlocal speech
+        while True:
+            match = SENTENCE_END.search(speech)
+            if not match:
+                break
+            sentence, speech = speech[:match.end()].strip(), speech[match.end():]
+            if sentence and on_speech:
+                on_speech(sentence)
+        if final and speech.strip() and on_speech:
+            on_speech(speech.strip())
+            speech = ""
+
+    def on_field(key, value):
+        nonlocal dispatched
+        if key == "response":
+            flush_speech(final=True)
+        fields = parser.fields
+        if not dispatched and "entity" in fields and "intent" in fields:
+            dispatched = True
+            if on_intent and fields["entity"] and fields["intent"]:
+                on_intent(fields["entity"], fields["intent"])
+
+    def on_string(key, delta):
+        nonlocal speech
+        if key == "response":
+            speech += delta
+            flush_speech()
+
+    parser = IncrementalJSONParser(on_field=on_field, on_string=on_string)
+
+    try:
+        stream = client.chat.completions.create(
+            model=GPT_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            stream=True
+        )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parser.feed(delta)
+            if parser.done:
+                break
+
+        if not parser.done:
+            raise ValueError(f"Incomplete JSON in streamed reply: {parser.fields}")
+        result = dict(parser.fields)
+        cache.put(text, result)
+        return result
     except Exception as e:
         return {
             "response": f"Failed to understand the command: {str(e)}",
             "debug_prompt": prompt,
             "traceback": traceback.format_exc()
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,114 @@
+import time
+import json
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from metrics import observe, summaries, submit_traced
+
+RETRY_STATUSES = {502, 503, 504}
+
+
+class HAClient:
+    """Home Assistant REST client with a keep-alive pool, retries and call batching
+
+    Connection errors and 502/503/504 responses are retried with exponential
+    backoff. Read timeouts are not retried, since HA may already have acted
+    on a non-idempotent service such as toggle.
+    """
+
+    def __init__(self, base_url, token, pool_size=8, retries=2, backoff=0.2, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ha-call")
+
+    def post(self, path, payload, metric):
+        """POST with bounded retries; returns the final response or raises"""
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except requests.ConnectionError:
+                observe(f"ha.{metric}", time.perf_counter() - start)
+                if attempt >= self.retries:
+                    raise
+            else:
+                observe(f"ha.{metric}", time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            attempt += 1
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    def get(self, path):
+        response = self.session.get(f"{self.base_url}{path}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def call_service(self, domain, service, payload):
+        """Call one HA service; returns True on HTTP 200"""
+        try:
+            response = self.post(f"/api/services/{domain}/{service}", payload, f"{domain}.{service}")
+            print(f"[HA] Called {domain}.{service} on {payload.get('entity_id')} | Status: {response.status_code}")
+            return response.status_code == 200
+        except Exception as e:
+            print(f"[ERROR] Failed to call HA service {domain}.{service}: {e}")
+            return False
+
+    def call_services(self, calls):
+        """Run (entity_id, service, service_data) calls as few, concurrent HA requests
+
+        Calls sharing a domain, service and service_data collapse into one
+        request with an entity_id list. Returns {entity_id: success}.
+        """
+        groups = {}
+        for entity_id, service, service_data in calls:
+            domain = entity_id.split(".", 1)[0]
+            key = (domain, service, json.dumps(service_data or {}, sort_keys=True))
+            groups.setdefault(key, []).append(entity_id)
+
+        def run(key, entity_ids):
+            domain, service, service_data = key
+            payload = dict(json.loads(service_data))
+            payload["entity_id"] = entity_ids[0] if len(entity_ids) == 1 else entity_ids
+            return self.call_service(domain, service, payload)
+
+        if len(groups) == 1:
+            key, entity_ids = next(iter(groups.items()))
+            ok = run(key, entity_ids)
+            return {entity_id: ok for entity_id in entity_ids}
+
+        futures = {key: submit_traced(self._executor, run, key, ids) for key, ids in groups.items()}
+        results = {}
+        for key, future in futures.items():
+            ok = future.result()
+            for entity_id in groups[key]:
+                results[entity_id] = ok
+        return results
+
+    def latency_summary(self):
+        return summaries("ha.")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ha_client(base_url, token):
+    """Shared client per HA instance so every caller reuses the same pool"""
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = _clients[base_url] = HAClient(base_url, token)
+        return client
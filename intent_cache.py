@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from entity_registry import get_registry, tokenize
+
+CACHE_FILE = os.getenv("INTENT_CACHE_FILE", "intent_cache.json")
+CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", str(7 * 24 * 3600)))
+KEY_VERSION = 2     # entries keyed by an older normalize() are discarded on load
+
+FILLER_WORDS = {
+    "please", "jarvis", "hey", "ok", "okay", "um", "uh", "er", "erm", "could",
+    "can", "would", "you", "the", "a", "an", "turn", "just", "now",
+    "thanks", "thank", "my", "for", "me",
+}
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20,
+    "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70,
+    "eighty": 80, "ninety": 90, "hundred": 100,
+}
+
+
+def normalize(text):
+    """Cache key: 'Please turn on the Kitchen Lights' == 'on kitchen light'
+
+    Case, plurals, filler words and spelled-out numbers are normalized; word
+    order and repeats are kept, since they decide which verb goes with which
+    device ("on kitchen off bedroom" is not "off kitchen on bedroom").
+    """
+    words = []
+    pending = None
+    for token in tokenize(text):
+        if token in FILLER_WORDS:
+            continue
+        number = NUMBER_WORDS.get(token)
+        if number is not None:
+            # "twenty one" -> 21
+            if pending is not None and pending % 10 == 0 and pending >= 20 and number < 10:
+                pending += number
+            else:
+                if pending is not None:
+                    words.append(str(pending))
+                pending = number
+            continue
+        if pending is not None:
+            words.append(str(pending))
+            pending = None
+        words.append(token)
+    if pending is not None:
+        words.append(str(pending))
+    return " ".join(words)
+
+
+class IntentCache:
+    """LRU/TTL cache of resolved {entity, intent, response} results
+
+    Entries are tagged with the registry fingerprint they were resolved
+    against and dropped once the entity set or names change.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=CACHE_SIZE, ttl=CACHE_TTL, registry=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.registry = registry
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _fingerprint(self):
+        return (self.registry or get_registry()).fingerprint
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"[CACHE] Could not load {self.path}: {e}")
+            return
+        now = time.time()
+        for key, entry in stored.items():
+            if entry.get("key_version") != KEY_VERSION:
+                continue
+            if now - entry.get("created", 0) < self.ttl:
+                self._entries[key] = entry
+        print(f"[CACHE] Loaded {len(self._entries)} cached intents from {self.path}")
+
+    def _save(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"[CACHE] Could not save {self.path}: {e}")
+
+    def get(self, text):
+        key = normalize(text)
+        fingerprint = self._fingerprint()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() - entry["created"] >= self.ttl or entry["fingerprint"] != fingerprint:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["result"])
+
+    def put(self, text, result):
+        if not isinstance(result, dict) or not result.get("entity") or not result.get("intent"):
+            return
+        # Never replay a hallucinated entity or service from the cache
+        if not str(result["intent"]).isidentifier() or (self.registry or get_registry()).get(result["entity"]) is None:
+            return
+        key = normalize(text)
+        entry = {
+            "result": {k: result[k] for k in ("entity", "intent", "response") if k in result},
+            "fingerprint": self._fingerprint(),
+            "created": time.time(),
+            "key_version": KEY_VERSION,
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_intent_cache():
+    """Shared intent cache, loaded from disk on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = IntentCache()
+    return _cache
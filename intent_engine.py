@@ -0,0 +1,377 @@
+import time
+import random
+import threading
+from collections import deque
+from entity_registry import (
+    get_registry, tokenize, entity_name, CONTROLLABLE_DOMAINS, AUXILIARY_TOKENS, DOMAIN_HINTS,
+)
+
+# Verb phrases mapped to a generic action
+VERBS = {
+    "turn on": "on", "switch on": "on", "power on": "on", "enable": "on",
+    "turn off": "off", "switch off": "off", "power off": "off", "disable": "off",
+    "toggle": "toggle",
+    "lock": "lock", "unlock": "unlock",
+    "open": "open", "close": "close", "shut": "close",
+    "play": "play", "resume": "play", "pause": "pause", "stop": "stop",
+    "start": "start", "run": "start", "activate": "start",
+}
+
+# Per-domain service for each generic action
+DOMAIN_SERVICES = {
+    "light": {"on": "turn_on", "off": "turn_off", "toggle": "toggle"},
+    "switch": {"on": "turn_on", "off": "turn_off", "toggle": "toggle"},
+    "fan": {"on": "turn_on", "off": "turn_off", "toggle": "toggle", "start": "turn_on", "stop": "turn_off"},
+    "input_boolean": {"on": "turn_on", "off": "turn_off", "toggle": "toggle"},
+    "siren": {"on": "turn_on", "off": "turn_off", "toggle": "toggle"},
+    "automation": {"on": "turn_on", "off": "turn_off", "toggle": "toggle", "start": "trigger"},
+    "climate": {"on": "turn_on", "off": "turn_off"},
+    "lock": {"lock": "lock", "unlock": "unlock"},
+    "cover": {"on": "open_cover", "off": "close_cover", "open": "open_cover",
+              "close": "close_cover", "stop": "stop_cover", "toggle": "toggle"},
+    "media_player": {"on": "turn_on", "off": "turn_off", "play": "media_play",
+                     "pause": "media_pause", "stop": "media_stop", "toggle": "media_play_pause"},
+    "vacuum": {"on": "start", "start": "start", "off": "return_to_base", "stop": "stop"},
+    "script": {"on": "turn_on", "start": "turn_on", "off": "turn_off", "stop": "turn_off"},
+    "scene": {"on": "turn_on", "start": "turn_on"},
+}
+
+ACTION_WORDS = {
+    "on": "Turning on", "off": "Turning off", "toggle": "Toggling",
+    "lock": "Locking", "unlock": "Unlocking", "open": "Opening", "close": "Closing",
+    "play": "Playing", "pause": "Pausing", "stop": "Stopping", "start": "Starting",
+}
+
+# Spoken phrases that predate the registry; they win over registry names
+ALIASES = {
+    "kitchen": ("light.kitchen", "kitchen lights"),
+    "kitchen light": ("light.kitchen", "kitchen lights"),
+    "conservatory": ("switch.conservatory_lights_switch_1", "conservatory lights"),
+    "conservatory light": ("switch.conservatory_lights_switch_1", "conservatory lights"),
+}
+
+# Head nouns shared across a coordinated list ("kitchen and conservatory lights")
+HEAD_WORDS = {
+    "light", "switch", "plug", "speaker", "heating", "radiator", "heater",
+    "lock", "curtain", "blind", "fan", "door",
+}
+
+CONJUNCTIONS = {"and", "plus"}
+SKIP_WORDS = {"the", "a", "an", "my", "please", "jarvis", "hey", "can", "you", "could", "would", "all"}
+GENERIC_SUFFIX = {"switch", "outlet", "plug"}
+
+# Words a command may contain outside any verb or target phrase; anything
+# else means the grammar only understood part of the utterance
+FUNCTION_WORDS = {"in", "on", "off", "at", "of", "for", "to", "now", "too", "also", "then", "it", "them"}
+# First half of a split verb: "turn the kitchen light off"
+PARTICLE_VERBS = {"turn", "switch", "power"}
+
+
+def _words(text):
+    return [t for t in tokenize(text) if t not in SKIP_WORDS]
+
+
+def _core_phrase(tokens):
+    """Drop trailing 'Switch 1' / 'Outlet' style suffixes from a device name"""
+    tokens = list(tokens)
+    while len(tokens) > 1:
+        if tokens[-1] == "1" and len(tokens) > 2 and tokens[-2] in GENERIC_SUFFIX:
+            tokens = tokens[:-2]
+        elif tokens[-1] in GENERIC_SUFFIX:
+            tokens = tokens[:-1]
+        else:
+            break
+    return tuple(tokens)
+
+
+class TokenAutomaton:
+    """Aho-Corasick automaton over word tokens
+
+    Finds every occurrence of every compiled phrase in one pass over the
+    utterance, independent of how many phrases were compiled.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, phrase, payload):
+        node = 0
+        for token in phrase:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(phrase), payload))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def search(self, tokens):
+        """Yield (start, end, payload) for every phrase occurrence"""
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for end, token in enumerate(tokens, 1):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for length, payload in out[node]:
+                yield end - length, end, payload
+
+
+class IntentEngine:
+    """Local intent matcher compiled from the entity registry plus a verb grammar"""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.version = registry.version
+        self.automaton = TokenAutomaton()
+        targets = {}
+
+        for entity_id in registry.by_id:
+            domain, object_id = entity_id.split(".", 1)
+            if domain not in CONTROLLABLE_DOMAINS:
+                continue
+            entity = registry.by_id[entity_id]
+            name_tokens = tuple(_words(entity_name(entity)))
+            object_tokens = tuple(_words(object_id.replace("_", " ")))
+            for phrase in {name_tokens, _core_phrase(name_tokens), object_tokens, _core_phrase(object_tokens)}:
+                if phrase:
+                    targets.setdefault(phrase, []).append(entity)
+
+        for phrase, candidates in targets.items():
+            candidates.sort(key=lambda e: self._preference(e, phrase))
+
+        for alias, (entity_id, spoken) in ALIASES.items():
+            phrase = tuple(_words(alias))
+            alias_entity = {"entity_id": entity_id, "attributes": {"friendly_name": spoken}, "alias": True}
+            targets[phrase] = [alias_entity] + [e for e in targets.get(phrase, []) if e["entity_id"] != entity_id]
+
+        for phrase, candidates in targets.items():
+            self.automaton.add(phrase, ("target", candidates))
+        for verb, action in VERBS.items():
+            self.automaton.add(tuple(tokenize(verb)), ("verb", action))
+        self.automaton.build()
+        self.target_phrases = list(targets)
+
+    @staticmethod
+    def _preference(entity, phrase):
+        """Sort key: real devices before helpers, available before unavailable, exact names first"""
+        name_tokens = set(tokenize(entity_name(entity)))
+        auxiliary = bool((name_tokens & AUXILIARY_TOKENS) - set(phrase))
+        unavailable = entity.get("state") in ("unavailable", "unknown")
+        return (auxiliary, unavailable, len(name_tokens) - len(phrase), entity["entity_id"])
+
+    @staticmethod
+    def _distribute_heads(tokens):
+        """'kitchen and conservatory light' -> 'kitchen light and conservatory light'"""
+        segments = [[]]
+        for token in tokens:
+            if token in CONJUNCTIONS:
+                segments.append([])
+            else:
+                segments[-1].append(token)
+        if len(segments) < 2:
+            return tokens
+
+        last = segments[-1]
+        head_start = len(last)
+        while head_start > 0 and last[head_start - 1] in HEAD_WORDS:
+            head_start -= 1
+        head = last[head_start:]
+        if not head or head_start == 0:
+            return tokens
+
+        result = []
+        for index, segment in enumerate(segments):
+            if index:
+                result.append("and")
+            result.extend(segment)
+            if index < len(segments) - 1 and not (set(segment) & HEAD_WORDS):
+                result.extend(head)
+        return result
+
+    def match(self, text):
+        """Resolve an utterance to a list of {entity, service, response} commands"""
+        tokens = self._distribute_heads(_words(text))
+        hits = sorted(self.automaton.search(tokens), key=lambda h: (h[0], -(h[1] - h[0])))
+
+        # Leftmost-longest, non-overlapping
+        chosen = []
+        position = 0
+        for start, end, payload in hits:
+            if start >= position:
+                chosen.append((start, end, payload))
+                position = end
+
+        # Each target takes the nearest verb before it ("turn on X and turn off Y")
+        action = None
+        targets = []
+        covered = set()
+        verb_tokens = set()
+        for start, end, (kind, value) in chosen:
+            covered.update(range(start, end))
+            if kind == "verb":
+                action = value
+                verb_tokens.update(range(start, end))
+            elif targets and targets[-1][1] == start and set(tokens[start:end]) <= HEAD_WORDS:
+                # "driveway light": the head noun belongs to the target before it
+                continue
+            else:
+                targets.append((start, end, value, action))
+        if not targets:
+            return []
+
+        split_actions = [(i, t) for i, t in enumerate(tokens) if i not in covered and t in ("on", "off")]
+        loose_heads = set()
+        for index, token in enumerate(tokens):
+            if index in covered or token in CONJUNCTIONS or token in FUNCTION_WORDS:
+                continue
+            if token in DOMAIN_HINTS:
+                # "kitchen speaker": checked against the target's domain below
+                continue
+            if token in HEAD_WORDS:
+                # No domain to check "heater" against; the device's name must carry it
+                loose_heads.add(token)
+                continue
+            if token in PARTICLE_VERBS and split_actions:
+                continue
+            # Part of the utterance wasn't understood; let GPT have the whole thing
+            return []
+
+        # Head words outside verbs ("fan", "light") must agree with every target's domain
+        hinted = set()
+        for index, token in enumerate(tokens):
+            if index not in verb_tokens:
+                hinted.update(DOMAIN_HINTS.get(token, ()))
+
+        first_verb = next((value for _, _, (kind, value) in chosen if kind == "verb"), None)
+        commands = []
+        seen = set()
+        for start, end, candidates, bound in targets:
+            if bound is None:
+                # "turn the kitchen light off": the on/off after the target, else any verb
+                bound = next((t for i, t in split_actions if i >= end), first_verb)
+            if bound is None:
+                return []
+            phrase = " ".join(tokens[start:end])
+            target = self._pick(phrase, candidates, bound)
+            if target is None:
+                return []
+            entity_id, spoken = target
+            domain = entity_id.split(".", 1)[0]
+            if hinted and domain not in hinted:
+                return []
+            if entity_id in seen:
+                continue
+            seen.add(entity_id)
+            loose_heads -= set(tokenize(entity_name(self.registry.get(entity_id) or {"entity_id": entity_id})))
+            commands.append({"entity": entity_id, "service": DOMAIN_SERVICES[domain][bound],
+                             "spoken": spoken, "action": bound})
+        if loose_heads:
+            return []
+
+        # "Turning on kitchen lights, turning off conservatory lights"
+        parts = []
+        for command in commands:
+            if parts and parts[-1][0] == command["action"]:
+                parts[-1][1].append(command["spoken"])
+            else:
+                parts.append((command["action"], [command["spoken"]]))
+        response = ", ".join(f"{ACTION_WORDS[a]} {' and '.join(spoken)}" for a, spoken in parts)
+        response = response[:1] + response[1:].replace(", T", ", t")
+        for command in commands:
+            del command["spoken"], command["action"]
+            command["response"] = response
+        return commands
+
+    def _pick(self, phrase, candidates, action):
+        """First candidate whose domain supports the action, else the best registry match"""
+        for entity in candidates:
+            entity_id = entity["entity_id"]
+            if action in DOMAIN_SERVICES.get(entity_id.split(".", 1)[0], {}):
+                spoken = entity_name(entity) if entity.get("alias") else phrase
+                return entity_id, spoken
+
+        # "lock the living room" names the room, not the lock
+        domains = {d for d, services in DOMAIN_SERVICES.items() if action in services}
+        resolved = self.registry.resolve(phrase, domains=domains, limit=1)
+        if resolved:
+            return resolved[0]["entity_id"], " ".join(_core_phrase(_words(resolved[0]["name"])))
+        return None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_intent_engine():
+    """Shared engine, recompiled whenever the registry is re-indexed"""
+    global _engine
+    registry = get_registry()
+    if _engine is None or _engine.version != registry.version:
+        with _engine_lock:
+            if _engine is None or _engine.version != registry.version:
+                start = time.perf_counter()
+                _engine = IntentEngine(registry)
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"[INTENT] Compiled {len(_engine.target_phrases)} target phrases in {elapsed:.1f}ms")
+    return _engine
+
+
+def match_command(text):
+    return get_intent_engine().match(text)
+
+
+def synthetic_corpus(engine, size=5000, seed=1):
+    """Random single, multi-target and unmatched utterances built from the grammar"""
+    rng = random.Random(seed)
+    names = [" ".join(p) for p in engine.target_phrases]
+    verbs = list(VERBS)
+    fillers = ["", "please ", "hey jarvis ", "can you "]
+    corpus = []
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            corpus.append(f"{rng.choice(fillers)}{rng.choice(verbs)} the {rng.choice(names)}")
+        elif kind == 1:
+            corpus.append(f"{rng.choice(verbs)} the {rng.choice(names)} and {rng.choice(names)}")
+        elif kind == 2:
+            corpus.append(f"{rng.choice(names)} {rng.choice(['on', 'off'])}")
+        else:
+            corpus.append(f"what is the weather like in {rng.choice(names)} today")
+    return corpus
+
+
+if __name__ == "__main__":
+    engine = get_intent_engine()
+    corpus = synthetic_corpus(engine)
+
+    for sample in ("turn off the kitchen and conservatory lights", "workshop light on", "lock the living room"):
+        print(f"'{sample}' -> {[(c['entity'], c['service']) for c in engine.match(sample)]}")
+
+    matched = 0
+    start = time.perf_counter()
+    for utterance in corpus:
+        if engine.match(utterance):
+            matched += 1
+    elapsed = time.perf_counter() - start
+    print(f"{len(corpus)} utterances, {matched} matched, {len(corpus) / elapsed:,.0f} utterances/sec "
+          f"({elapsed / len(corpus) * 1e6:.0f} us each)")
@@ -1,13 +1,26 @@
 import os
 import json
-import requests
-import tempfile
+import atexit
 import base64
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 import speech_recognition as sr
 from io import BytesIO
 import wave
+from concurrent.futures import ThreadPoolExecutor
+from entity_registry import get_registry, tokenize, CONTROLLABLE_DOMAINS, DOMAIN_HINTS, STOP_WORDS
+from state_mirror import start_state_mirror, get_state_mirror
+from intent_cache import get_intent_cache, normalize
+from intent_engine import match_command, get_intent_engine
+from ha_client import get_ha_client
+from stt_scheduler import STTScheduler, STTBackend
+from audio_stream import AudioStream, UploadTooLarge
+from audio_preprocess import preprocess_audio, noise_profiles
+from sphinx_pool import SphinxPool
+from dispatch_queue import DispatchQueue
+from coalesce import Coalescer, audio_fingerprint
+from metrics import span, start_trace, end_trace, submit_traced, render_prometheus
 
 load_dotenv()
 
@@ -15,18 +28,58 @@ HA_URL = os.getenv("HA_URL", "http://10.0.0.103:8123")
 HA_TOKEN = os.getenv("HA_TOKEN")
 SPEAKER_ENTITY = os.getenv("TTS_SPEAKER", "media_player.kitchen")
 
+GPT_STREAMING = os.getenv("GPT_STREAMING", "1") == "1"
+STT_HEDGE_DELAY = float(os.getenv("STT_HEDGE_DELAY", "1.5"))
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "20"))
+STT_WORKERS = int(os.getenv("STT_WORKERS", "24"))
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") == "1"
+SPHINX_POOL = os.getenv("SPHINX_POOL", "1") == "1"
+SPHINX_GRAMMAR = os.getenv("SPHINX_GRAMMAR", "0") == "1"
+GOOGLE_STT_ENDPOINT = os.getenv("GOOGLE_STT_ENDPOINT")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(16 * 1024 * 1024)))
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "4"))
+DISPATCH_MAX_PENDING = int(os.getenv("DISPATCH_MAX_PENDING", "32"))
+
 if not HA_TOKEN:
     raise ValueError("HA_TOKEN not set in environment variables")
 
-HEADERS = {
-    "Authorization": f"Bearer {HA_TOKEN}",
-    "Content-Type": "application/json"
-}
+# Shared keep-alive connection pool for every HA call
+ha = get_ha_client(HA_URL, HA_TOKEN)
 
 app = Flask(__name__)
+# Bounds request bodies; streamed uploads also stop at MAX_UPLOAD_BYTES while they arrive
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+@app.before_request
+def begin_trace():
+    """Time every request; spans recorded while handling it are tagged with its ID"""
+    g.trace = start_trace(request.endpoint or "unknown", request.headers.get("X-Request-ID"))
+
+@app.after_request
+def finish_trace(response):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        end_trace(trace)
+        response.headers["X-Request-ID"] = trace.request_id
+        if trace.spans:
+            print(f"[TRACE] {trace.line()}")
+    return response
+
+# Transcription of streamed uploads runs here while the request thread reads the body
+upload_pool = ThreadPoolExecutor(max_workers=4)
+
+# Service calls fired mid-stream run here
+service_pool = ThreadPoolExecutor(max_workers=4)
+
+# TTS runs in the background so replies don't wait on it; ordered per speaker,
+# drained on shutdown so queued announcements still play
+dispatcher = DispatchQueue(workers=DISPATCH_WORKERS, max_pending=DISPATCH_MAX_PENDING)
+atexit.register(dispatcher.shutdown)
 
 # Initialize speech recognition
 recognizer = sr.Recognizer()
+# recognize_google has no timeout of its own and would hold an STT thread forever
+recognizer.operation_timeout = STT_TIMEOUT
 
 # Speaker mapping for location-aware responses
 SPEAKER_MAP = {
@@ -36,194 +89,326 @@ SPEAKER_MAP = {
     "conservatory_mic": "media_player.kitchen",  # fallback to kitchen
 }
 
+# State words in "is the X <state>" questions; some also say which domain X is
+STATE_WORD_HINTS = {
+    "locked": ("lock",),
+    "unlocked": ("lock",),
+    "playing": ("media_player",),
+    "paused": ("media_player",),
+}
+STATE_WORDS = {"open", "closed", "idle", "running", "home", "away"} | set(STATE_WORD_HINTS)
+
+_whisper_client = None
+
+def get_whisper_client():
+    """Long-lived OpenAI client so Whisper requests reuse one connection pool"""
+    global _whisper_client
+    if _whisper_client is None:
+        import openai
+        _whisper_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=STT_TIMEOUT)
+    return _whisper_client
+
 def transcribe_audio_whisper_api(audio_data):
     """Transcribe audio using OpenAI Whisper API"""
-    try:
-        import openai
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        # Save audio data to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file.flush()
-            
-            # Transcribe using Whisper API
-            with open(temp_file.name, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="en"
-                )
-                
-            os.unlink(temp_file.name)  # Clean up temp file
-            return transcript.text
-            
-    except Exception as e:
-        print(f"[ERROR] Whisper API transcription failed: {e}")
-        return None
+    client = get_whisper_client()
+    
+    # Upload straight from memory, no temporary file
+    transcript = client.audio.transcriptions.create(
+        model="whisper-1",
+        file=("audio.wav", audio_data, "audio/wav"),
+        language="en"
+    )
+    print(f"[STT] Whisper recognized: '{transcript.text}'")
+    return transcript.text
 
 def transcribe_audio_google(audio_data):
     """Transcribe audio using Google Speech Recognition (free, offline-capable)"""
+    # Convert audio data to AudioFile
+    audio_file = sr.AudioFile(BytesIO(audio_data))
+    
+    with audio_file as source:
+        # Noise is handled by preprocess_audio, so every sample is kept for recognition
+        audio = recognizer.record(source)
+    
     try:
-        # Convert audio data to AudioFile
-        audio_file = sr.AudioFile(BytesIO(audio_data))
-        
-        with audio_file as source:
-            # Adjust for ambient noise
-            recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            audio = recognizer.record(source)
-        
         # Use Google Speech Recognition
-        text = recognizer.recognize_google(audio)
+        # SpeechRecognition < 3.11 has no endpoint argument, so only pass an override
+        options = {"endpoint": GOOGLE_STT_ENDPOINT} if GOOGLE_STT_ENDPOINT else {}
+        text = recognizer.recognize_google(audio, **options)
         print(f"[STT] Google recognized: '{text}'")
         return text
-        
     except sr.UnknownValueError:
         print("[STT] Google could not understand audio")
         return None
-    except sr.RequestError as e:
-        print(f"[STT] Google error: {e}")
-        return None
-    except Exception as e:
-        print(f"[ERROR] STT processing failed: {e}")
-        return None
 
 def transcribe_audio_sphinx(audio_data):
     """Transcribe audio using PocketSphinx (completely offline)"""
+    if SPHINX_POOL:
+        # Warm decoders in worker processes; models are not reloaded per call
+        text = sphinx_pool.decode(audio_data, timeout=STT_TIMEOUT)
+        if not text:
+            print("[STT] Sphinx could not understand audio")
+            return None
+        print(f"[STT] Sphinx recognized: '{text}'")
+        return text
+    
+    # Convert audio data to AudioFile
+    audio_file = sr.AudioFile(BytesIO(audio_data))
+    
+    with audio_file as source:
+        audio = recognizer.record(source)
+    
     try:
-        # Convert audio data to AudioFile
-        audio_file = sr.AudioFile(BytesIO(audio_data))
-        
-        with audio_file as source:
-            audio = recognizer.record(source)
-        
         # Use PocketSphinx (offline)
         text = recognizer.recognize_sphinx(audio)
         print(f"[STT] Sphinx recognized: '{text}'")
         return text
-        
     except sr.UnknownValueError:
         print("[STT] Sphinx could not understand audio")
         return None
-    except sr.RequestError as e:
-        print(f"[STT] Sphinx error: {e}")
-        return None
-    except Exception as e:
-        print(f"[ERROR] Sphinx STT failed: {e}")
+
+def transcribe_stream_sphinx(stream):
+    """Transcribe a streamed upload with PocketSphinx while it is still arriving"""
+    text = sphinx_pool.stream(stream, timeout=STT_TIMEOUT)
+    if not text:
+        print("[STT] Sphinx could not understand streamed audio")
         return None
+    print(f"[STT] Sphinx recognized stream: '{text}'")
+    return text
 
-def transcribe_audio(audio_data):
-    """Try multiple STT methods in order of preference"""
-    print("[STT] Starting transcription...")
-    
-    # Method 1: Try OpenAI Whisper API (best quality)
-    if os.getenv("OPENAI_API_KEY"):
-        print("[STT] Trying OpenAI Whisper API...")
-        result = transcribe_audio_whisper_api(audio_data)
-        if result:
-            return result
-    
-    # Method 2: Try Google Speech Recognition (good quality, requires internet)
-    print("[STT] Trying Google Speech Recognition...")
-    result = transcribe_audio_google(audio_data)
-    if result:
-        return result
-    
-    # Method 3: Try PocketSphinx (offline, lower quality)
-    print("[STT] Trying PocketSphinx (offline)...")
-    result = transcribe_audio_sphinx(audio_data)
-    if result:
-        return result
-    
-    print("[STT] All transcription methods failed")
-    return None
+# Offline decoders stay loaded in a process pool sized to the CPU count
+sphinx_pool = SphinxPool(use_grammar=SPHINX_GRAMMAR)
+
+# Backends in order of preference; errors raised above trip their circuit breakers
+stt_scheduler = STTScheduler([
+    STTBackend("whisper_api", transcribe_audio_whisper_api, enabled=lambda: bool(os.getenv("OPENAI_API_KEY"))),
+    STTBackend("google", transcribe_audio_google),
+    STTBackend("sphinx", transcribe_audio_sphinx, stream=transcribe_stream_sphinx if SPHINX_POOL else None),
+], hedge_delay=STT_HEDGE_DELAY, timeout=STT_TIMEOUT, workers=STT_WORKERS)
+
+# The same utterance heard by several mics is transcribed once
+stt_dedup = Coalescer(name="stt")
+
+def transcribe_audio(audio_data, device="unknown", fingerprint=None):
+    """Try STT backends in order of preference, hedging slow ones
+    
+    Clips with a fingerprint share one transcription with matching clips
+    from other mics; streamed uploads start before they can be fingerprinted.
+    """
+    def prepare(data):
+        with span("stage.preprocess"):
+            return preprocess_audio(data, device)
+    
+    def work(reply):
+        print("[STT] Starting transcription...")
+        return stt_scheduler.transcribe(audio_data, prepare=prepare if AUDIO_PREPROCESS else None)
+    
+    with span("stage.stt"):
+        return stt_dedup.run(fingerprint, device, work, level=fingerprint.level if fingerprint else None)
 
 def call_service(entity_id, service, service_data=None):
     """Send service call to Home Assistant"""
     domain = entity_id.split(".")[0]
-    url = f"{HA_URL}/api/services/{domain}/{service}"
     payload = {"entity_id": entity_id}
     if service_data:
         payload.update(service_data)
-    
-    try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=10)
-        print(f"[HA] Called {domain}.{service} on {entity_id} | Status: {response.status_code}")
-        return response.status_code == 200
-    except Exception as e:
-        print(f"[ERROR] Failed to call HA service: {e}")
-        return False
+    return ha.call_service(domain, service, payload)
+
+def call_services(commands):
+    """Send several commands, batching same-service entities into one HA call"""
+    return ha.call_services([(c["entity"], c["service"], c.get("service_data")) for c in commands])
+
+def speaker_for(device):
+    """Speaker entity closest to the given microphone"""
+    room = device.replace("_mic", "").replace("_test", "")
+    return SPEAKER_MAP.get(device) or SPEAKER_MAP.get(f"{room}_mic") or SPEAKER_ENTITY
 
 def speak_response(message, device="unknown"):
     """Send TTS to appropriate speaker based on device location"""
     room = device.replace("_mic", "").replace("_test", "")
-    speaker_entity = SPEAKER_MAP.get(device) or SPEAKER_MAP.get(f"{room}_mic") or SPEAKER_ENTITY
+    speaker_entity = speaker_for(device)
     
-    url = f"{HA_URL}/api/services/tts/google_translate_say"
     payload = {
         "entity_id": speaker_entity,
         "message": message
     }
     
     try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=10)
+        response = ha.post("/api/services/tts/google_translate_say", payload, "tts.google_translate_say")
         print(f"[TTS] Sent to {speaker_entity} ({room}): {message} | Status: {response.status_code}")
         return response.status_code == 200
     except Exception as e:
         print(f"[ERROR] Failed to send TTS: {e}")
         return False
 
-def handle_voice_command(text, device="unknown"):
-    """Process voice command using simple keyword matching"""
+def _merge_speech(queued, new):
+    message, device = queued
+    # End each sentence so TTS pauses between them instead of running them together
+    if not message.rstrip().endswith((".", "!", "?")):
+        message = message.rstrip() + "."
+    return (f"{message} {new[0]}", device)
+
+def respond(message, device="unknown"):
+    """Queue TTS behind earlier replies for the same speaker and return at once
+    
+    Sentences still waiting for a busy speaker are merged into one announcement.
+    """
+    if not dispatcher.submit(speaker_for(device), speak_response, message, device, merge=_merge_speech):
+        print(f"[TTS] Dropped reply for {device}: {message}")
+
+def current_state(entity_id):
+    """State from the live mirror when it is connected, else straight from HA
+    
+    The registry alone may hold a snapshot from hours ago, so it is never
+    trusted without a mirror keeping it up to date. None when HA can't answer.
+    """
+    mirror = get_state_mirror()
+    if mirror is not None and mirror.connected.is_set():
+        return get_registry().state(entity_id)
+    try:
+        return ha.get(f"/api/states/{entity_id}").get("state")
+    except Exception as e:
+        print(f"[STATE] Could not fetch {entity_id}: {e}")
+        return None
+
+def answer_state_query(text_lower):
+    """Answer 'is the X on' style questions from the current entity state
+    
+    Only answers when one entity accounts for the whole question: every
+    named word must be in its name (or its room), and a domain word like
+    "light" or "locked" must match its domain. Anything less falls through
+    to the grammar and GPT rather than reporting some other device's state.
+    """
+    if not text_lower.startswith(("is ", "are ")):
+        return None
+    
+    registry = get_registry()
+    hints = {}
+    words = set()
+    for token in tokenize(text_lower):
+        if token in STOP_WORDS:
+            continue
+        domains = DOMAIN_HINTS.get(token) or STATE_WORD_HINTS.get(token)
+        if domains:
+            hints[token] = domains
+        elif token not in STATE_WORDS:
+            words.add(token)
+    
+    hinted = set().union(*hints.values()) & CONTROLLABLE_DOMAINS if hints else CONTROLLABLE_DOMAINS
+    if not hinted:
+        return None
+    for best in registry.resolve(text_lower, domains=hinted, limit=5):
+        name_tokens = best["tokens"]
+        if words - name_tokens - {best["area"]}:
+            continue
+        # "light" is satisfied by a light, or by a switch with light in its name
+        if any(token not in name_tokens and best["domain"] != domains[0] for token, domains in hints.items()):
+            continue
+        state = current_state(best["entity_id"])
+        return f"{best['name']} is {state}" if state is not None else None
+    return None
+
+def handle_with_gpt(text, device="unknown", reply=None):
+    """Resolve a command with GPT, firing the HA call as soon as the intent is parsed
+    
+    The model's spoken reply is held back until its intent has been
+    validated and dispatched, so a hallucinated device is never announced.
+    """
+    from gpt_engine import ask_gpt, ask_gpt_stream
+    
+    reply = reply or (lambda message: respond(message, device))
+    registry = get_registry()
+    service_call = {}
+    held = []
+    
+    def on_intent(entity, intent):
+        if registry.get(entity) is None or not intent.isidentifier():
+            print(f"[GPT] Ignoring unknown target {entity} / {intent}")
+            return
+        print(f"[GPT] Dispatching {intent} on {entity}")
+        service_call.update(entity=entity, intent=intent)
+        service_call["future"] = submit_traced(service_pool, call_service, entity, intent)
+        for sentence in held:
+            reply(sentence)
+        held.clear()
+    
+    def on_speech(sentence):
+        if "future" in service_call:
+            reply(sentence)
+        else:
+            held.append(sentence)
+    
+    with span("stage.gpt"):
+        if GPT_STREAMING:
+            result = ask_gpt_stream(text, on_intent=on_intent, on_speech=on_speech)
+        else:
+            result = ask_gpt(text)
+            if result.get("entity") and result.get("intent"):
+                on_intent(result["entity"], result["intent"])
+            if result.get("response") and "traceback" not in result:
+                on_speech(result["response"])
+    
+    if "traceback" in result:
+        print(f"[GPT] {result['response']}")
+    
+    if "future" not in service_call:
+        # Nothing was dispatched, so whatever the model said it was doing is untrue
+        response_msg = f"Sorry, I don't understand '{text}'."
+        reply(response_msg)
+        return {"reply": response_msg}, 200
+    
+    with span("stage.ha"):
+        success = service_call["future"].result()
+    
+    if success:
+        return {"reply": result.get("response", "")}, 200
+    else:
+        error_msg = f"Failed to {service_call['intent']} {service_call['entity']}"
+        reply("Sorry, I couldn't control that device")
+        return {"error": error_msg}, 500
+
+# Mics that heard the same command share one execution; the loudest one gets the reply
+command_dedup = Coalescer(speak=lambda message, device: respond(message, device))
+
+def handle_voice_command(text, device="unknown", level=None):
+    """Process a voice command once, however many microphones heard it"""
+    return command_dedup.run(normalize(text), device, lambda reply: process_command(text, device, reply), level=level)
+
+def process_command(text, device, reply):
+    """Process voice command using the compiled intent grammar, falling back to GPT"""
     print(f"[COMMAND] Processing: '{text}' from {device}")
     
     text_lower = text.lower()
     
-    # Define command patterns
-    commands = {
-        ("turn off", "conservatory"): {
-            "entity": "switch.conservatory_lights_switch_1",
-            "service": "turn_off",
-            "response": "Turning off conservatory lights"
-        },
-        ("turn on", "conservatory"): {
-            "entity": "switch.conservatory_lights_switch_1", 
-            "service": "turn_on",
-            "response": "Turning on conservatory lights"
-        },
-        ("turn off", "kitchen"): {
-            "entity": "light.kitchen",
-            "service": "turn_off", 
-            "response": "Turning off kitchen lights"
-        },
-        ("turn on", "kitchen"): {
-            "entity": "light.kitchen",
-            "service": "turn_on",
-            "response": "Turning on kitchen lights"
-        }
-    }
+    with span("stage.state_query"):
+        state_reply = answer_state_query(text_lower)
+    if state_reply:
+        reply(state_reply)
+        return {"reply": state_reply}, 200
+    
+    # Match against the grammar compiled from the entity registry
+    with span("stage.intent"):
+        matched_commands = match_command(text)
     
-    # Find matching command
-    matched_command = None
-    for (action, target), command_data in commands.items():
-        if action in text_lower and target in text_lower:
-            matched_command = command_data
-            break
+    if not matched_commands and os.getenv("OPENAI_API_KEY"):
+        return handle_with_gpt(text, device, reply)
     
-    if not matched_command:
+    if not matched_commands:
         response_msg = f"Sorry, I don't understand '{text}'. Try commands like 'turn off conservatory lights'."
-        speak_response(response_msg, device)
+        reply(response_msg)
         return {"reply": response_msg}, 200
     
-    # Execute the command in Home Assistant
-    success = call_service(matched_command["entity"], matched_command["service"])
+    # Execute the commands in Home Assistant
+    with span("stage.ha"):
+        results = call_services(matched_commands)
+    failed = [c for c in matched_commands if not results[c["entity"]]]
     
-    if success:
-        speak_response(matched_command["response"], device)
-        return {"reply": matched_command["response"]}, 200
+    if not failed:
+        reply(matched_commands[0]["response"])
+        return {"reply": matched_commands[0]["response"]}, 200
     else:
-        error_msg = f"Failed to {matched_command['service']} {matched_command['entity']}"
-        speak_response("Sorry, I couldn't control that device", device)
+        error_msg = "; ".join(f"Failed to {c['service']} {c['entity']}" for c in failed)
+        reply("Sorry, I couldn't control that device")
         return {"error": error_msg}, 500
 
 @app.route("/api/audio_upload", methods=["POST"])
@@ -250,13 +435,16 @@ def audio_upload():
         
         # Decode base64 audio data
         try:
-            audio_data = base64.b64decode(audio_data_b64)
+            with span("stage.decode"):
+                audio_data = base64.b64decode(audio_data_b64)
         except Exception as e:
             print(f"[ERROR] Failed to decode audio data: {e}")
             return jsonify({"error": "Invalid audio data format"}), 400
         
-        # Transcribe the audio
-        transcribed_text = transcribe_audio(audio_data)
+        # Transcribe the audio, sharing the work with other mics that heard it
+        with span("stage.fingerprint"):
+            fingerprint = audio_fingerprint(audio_data)
+        transcribed_text = transcribe_audio(audio_data, device, fingerprint)
         
         if not transcribed_text:
             return jsonify({"error": "Speech recognition failed"}), 400
@@ -264,7 +452,7 @@ def audio_upload():
         print(f"[STT] Transcribed: '{transcribed_text}'")
         
         # Process the command
-        result = handle_voice_command(transcribed_text, device)
+        result = handle_voice_command(transcribed_text, device, fingerprint.level if fingerprint else None)
         
         return jsonify({
             "transcribed_text": transcribed_text,
@@ -272,10 +460,73 @@ def audio_upload():
             "status": "success"
         }), result[1]
         
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Audio upload larger than {MAX_UPLOAD_BYTES} bytes"}), 413
     except Exception as e:
         print(f"[ERROR] Exception in audio_upload: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+WAV_TYPES = {"audio/wav", "audio/wave", "audio/x-wav", "audio/vnd.wave"}
+PCM_TYPES = {"audio/l16", "audio/pcm", "application/octet-stream"}
+
+@app.route("/api/audio_stream", methods=["POST"])
+def audio_stream():
+    """Handle raw or chunked PCM/WAV uploads, transcribing while the body arrives"""
+    device = request.args.get("device") or request.headers.get("X-Device", "unknown")
+    mimetype = request.mimetype
+    
+    if mimetype in WAV_TYPES:
+        stream = AudioStream(max_size=MAX_UPLOAD_BYTES)
+    elif mimetype in PCM_TYPES:
+        # e.g. Content-Type: audio/L16; rate=16000; channels=1
+        params = request.mimetype_params
+        try:
+            rate = int(params.get("rate") or request.args.get("rate", 16000))
+            channels = int(params.get("channels") or request.args.get("channels", 1))
+            width = int(request.args.get("width", 2))
+        except ValueError:
+            return jsonify({"error": "Invalid PCM format parameters"}), 400
+        stream = AudioStream(pcm_format=(rate, channels, width), max_size=MAX_UPLOAD_BYTES)
+    else:
+        return jsonify({"error": f"Unsupported audio type '{mimetype}'"}), 415
+    
+    print(f"[AUDIO] Streaming upload from {device} ({mimetype})")
+    
+    try:
+        transcription = submit_traced(upload_pool, transcribe_audio, stream, device)
+        try:
+            with span("stage.upload"):
+                stream.ingest(request.stream, request.content_length)
+        except Exception as e:
+            stream.close(error=e)
+            print(f"[ERROR] Audio upload failed: {e}")
+            if isinstance(e, (UploadTooLarge, RequestEntityTooLarge)):
+                return jsonify({"error": f"Audio upload larger than {MAX_UPLOAD_BYTES} bytes"}), 413
+            return jsonify({"error": "Invalid or incomplete audio upload"}), 400
+        
+        print(f"[AUDIO] Received {len(stream)} bytes from {device}")
+        transcribed_text = transcription.result()
+        
+        if not transcribed_text:
+            return jsonify({"error": "Speech recognition failed"}), 400
+        
+        print(f"[STT] Transcribed: '{transcribed_text}'")
+        
+        # Fingerprinting the finished upload still lets the best-placed mic answer
+        with span("stage.fingerprint"):
+            fingerprint = audio_fingerprint(stream.getvalue())
+        result = handle_voice_command(transcribed_text, device, fingerprint.level if fingerprint else None)
+        
+        return jsonify({
+            "transcribed_text": transcribed_text,
+            "command_result": result[0],
+            "status": "success"
+        }), result[1]
+        
+    except Exception as e:
+        print(f"[ERROR] Exception in audio_stream: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route("/api/voice_trigger", methods=["POST"])
 def voice_trigger():
     """Handle text-based voice commands (for testing)"""
@@ -310,22 +561,42 @@ def health_check():
         "status": "healthy",
         "message": "Audio MAP server is running",
         "ha_url": HA_URL,
-        "stt_methods": ["whisper_api", "google", "sphinx"]
+        "stt_methods": ["whisper_api", "google", "sphinx"],
+        "intent_cache": get_intent_cache().stats(),
+        "stt_backends": stt_scheduler.status(),
+        "noise_floors": noise_profiles.snapshot(),
+        "dispatch": dispatcher.stats(),
+        "dedup": {"stt": stt_dedup.stats(), "commands": command_dedup.stats()},
+        "ha_latency": ha.latency_summary()
     }), 200
 
+@app.route("/api/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Latency histograms per request, pipeline stage and backend, for Prometheus"""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/", methods=["GET"])
 def root():
     """Root endpoint"""
     return jsonify({
         "service": "Audio MAP (Master Assistant Processor)",
         "status": "running",
-        "endpoints": ["/api/audio_upload", "/api/voice_trigger", "/api/health"]
+        "endpoints": ["/api/audio_upload", "/api/audio_stream", "/api/voice_trigger", "/api/health", "/api/metrics"]
     }), 200
 
 if __name__ == "__main__":
     print("🎙️ Audio MAP (Master Assistant Processor) server starting...")
     print(f"Home Assistant URL: {HA_URL}")
     print(f"Default TTS Speaker: {SPEAKER_ENTITY}")
+    get_intent_engine()
+    app.debug = os.getenv("FLASK_DEBUG", "1") == "1"
+    # The debug reloader runs this block in a watcher process too; only start
+    # background workers in the process that actually serves requests
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if SPHINX_POOL:
+            sphinx_pool.warm()
+        if os.getenv("HA_STATE_MIRROR", "1") == "1":
+            start_state_mirror()
     print("STT Methods: OpenAI Whisper API, Google Speech, PocketSphinx")
     print("Audio MAP server running on port 5000...")
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, debug=app.debug)
\ No newline at end of file
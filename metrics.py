@@ -0,0 +1,200 @@
+import re
+import sys
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds in seconds, Prometheus-style cumulative buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with approximate percentiles"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        """Consistent (bucket counts, count, sum)"""
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def percentile(self, q):
+        """Linear interpolation inside the bucket holding the q-th observation"""
+        counts, total, _ = self.snapshot()
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(counts):
+            upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 1),
+            "p95_ms": round(self.percentile(0.95) * 1000, 1),
+            "p99_ms": round(self.percentile(0.99) * 1000, 1),
+        }
+
+
+class Trace:
+    """Timed spans of one request, tagged with a request ID"""
+
+    def __init__(self, name, request_id=None):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.start = time.perf_counter()
+        self.spans = []     # (name, offset from start, seconds); appended from any thread
+        self.duration = None
+        self._token = None
+
+    def line(self):
+        spans = ", ".join(f"{name} {seconds * 1000:.1f}" for name, _, seconds in self.spans)
+        return f"{self.request_id} {self.name} {self.duration * 1000:.1f}ms: {spans}"
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def histogram(name):
+    """Named process-wide histogram, created on first use"""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _histograms_lock:
+            hist = _histograms.setdefault(name, LatencyHistogram())
+    return hist
+
+
+def observe(name, seconds, start=None):
+    """Record a duration in the named histogram and the current request's trace"""
+    histogram(name).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        if start is None:
+            start = time.perf_counter() - seconds
+        trace.spans.append((name, start - trace.start, seconds))
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, start)
+
+
+def start_trace(name, request_id=None):
+    """Begin a request trace; spans in this context (and submit_traced work) join it"""
+    trace = Trace(name, request_id)
+    trace._token = _current_trace.set(trace)
+    return trace
+
+
+def end_trace(trace):
+    trace.duration = time.perf_counter() - trace.start
+    histogram(f"request.{trace.name}").observe(trace.duration)
+    if trace._token is not None:
+        _current_trace.reset(trace._token)
+        trace._token = None
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def submit_traced(executor, fn, *args):
+    """executor.submit that keeps the caller's trace for spans recorded by fn"""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def summaries(prefix=""):
+    return {name: hist.summary() for name, hist in sorted(_histograms.items()) if name.startswith(prefix)}
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(namespace="jarvis"):
+    """Every histogram in Prometheus text format (0.0.4)
+
+    Histogram names are "<family>.<name>": "stt.google" becomes
+    jarvis_stt_seconds{name="google"}. Each family also gets a
+    <metric>_quantile gauge with p50/p95/p99.
+    """
+    families = {}
+    for name, hist in sorted(_histograms.items()):
+        family, _, member = name.partition(".")
+        families.setdefault(family, []).append((member or family, hist))
+
+    lines = []
+    for family, members in families.items():
+        metric = f"{namespace}_{re.sub(r'[^a-zA-Z0-9_]', '_', family)}_seconds"
+        lines.append(f"# HELP {metric} Latency of {family} operations in seconds.")
+        lines.append(f"# TYPE {metric} histogram")
+        for member, hist in members:
+            counts, count, total = hist.snapshot()
+            label = _label(member)
+            cumulative = 0
+            for bound, bucket_count in zip(hist.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{name="{label}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{name="{label}"}} {total:.6f}')
+            lines.append(f'{metric}_count{{name="{label}"}} {count}')
+        lines.append(f"# HELP {metric}_quantile Approximate latency percentiles from the {metric} buckets.")
+        lines.append(f"# TYPE {metric}_quantile gauge")
+        for member, hist in members:
+            label = _label(member)
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'{metric}_quantile{{name="{label}",quantile="{q}"}} {hist.percentile(q):.6f}')
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    start = time.perf_counter()
+    for _ in range(runs):
+        pass
+    baseline = time.perf_counter() - start
+
+    trace = start_trace("bench")
+    start = time.perf_counter()
+    for _ in range(runs):
+        with span("stage.bench"):
+            pass
+    elapsed = time.perf_counter() - start - baseline
+    end_trace(trace)
+    trace.spans.clear()
+    print(f"span() overhead: {elapsed / runs * 1e6:.2f} us per span")
+
+    start = time.perf_counter()
+    text = render_prometheus()
+    print(f"render_prometheus(): {(time.perf_counter() - start) * 1000:.2f} ms, {len(text.splitlines())} lines")
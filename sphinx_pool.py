@@ -0,0 +1,287 @@
+import os
+import re
+import sys
+import time
+import types
+import threading
+from multiprocessing.context import SpawnContext, SpawnProcess
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait
+from audio_preprocess import decode_wav, pcm_samples, resample
+
+SPHINX_WORKERS = int(os.getenv("SPHINX_WORKERS", str(os.cpu_count() or 1)))
+SPHINX_RATE = 16000
+
+# Set in each worker process by _init_worker; the models load once per process
+_decoder = None
+
+
+def sphinx_model_paths():
+    """The en-US model bundled with SpeechRecognition, as recognize_sphinx uses it"""
+    import speech_recognition
+    language_directory = os.path.join(os.path.dirname(speech_recognition.__file__), "pocketsphinx-data", "en-US")
+    return (
+        os.path.join(language_directory, "acoustic-model"),
+        os.path.join(language_directory, "language-model.lm.bin"),
+        os.path.join(language_directory, "pronounciation-dictionary.dict"),
+    )
+
+
+def _init_worker(model_paths, grammar):
+    global _decoder
+    from pocketsphinx import pocketsphinx
+
+    hmm, lm, dictionary = model_paths
+    config = pocketsphinx.Config()
+    config.set_string("-hmm", hmm)
+    config.set_string("-lm", lm)
+    config.set_string("-dict", dictionary)
+    config.set_string("-logfn", os.devnull)
+    if grammar:
+        # Filler and alternate-pronunciation arcs multiply the grammar's search space
+        config.set_boolean("-fsgusefiller", False)
+        config.set_boolean("-fsgusealtpron", False)
+    _decoder = pocketsphinx.Decoder(config)
+
+    if grammar:
+        _decoder.add_jsgf_string("commands", grammar)
+        _decoder.activate_search("commands")
+
+
+def _ping():
+    return _decoder is not None
+
+
+def _decoder_pcm(samples, rate):
+    samples, rate = resample(samples, rate, SPHINX_RATE)
+    return np.clip(samples * 32768.0, -32768, 32767).astype("<i2").tobytes()
+
+
+def _hypothesis():
+    hypothesis = _decoder.hyp()
+    return hypothesis.hypstr if hypothesis is not None and hypothesis.hypstr else None
+
+
+def _decode(audio_data):
+    samples, rate = decode_wav(audio_data)
+    raw = _decoder_pcm(samples, rate)
+
+    _decoder.start_utt()
+    _decoder.process_raw(raw, False, True)
+    _decoder.end_utt()
+    return _hypothesis()
+
+
+def _decode_stream(connection):
+    """Decode PCM chunks as SphinxPool.stream sends them; None if it hangs up early"""
+    try:
+        connection.send("ready")
+        rate, channels, width = connection.recv()
+        _decoder.start_utt()
+        try:
+            while True:
+                chunk = connection.recv_bytes()
+                if not chunk:
+                    break
+                _decoder.process_raw(_decoder_pcm(pcm_samples(chunk, channels, width), rate), False, False)
+        finally:
+            _decoder.end_utt()
+        return _hypothesis()
+    except (EOFError, OSError):
+        return None
+    finally:
+        connection.close()
+
+
+def _dictionary_words(dictionary_file):
+    words = set()
+    with open(dictionary_file, "r") as f:
+        for line in f:
+            word = line.split(" ", 1)[0]
+            if "(" not in word:
+                words.add(word)
+    return words
+
+
+def build_grammar(phrases, verbs, dictionary_file, plural_heads=()):
+    """JSGF grammar of '<verb> [the] <target> [on|off]' over in-vocabulary phrases"""
+    known = _dictionary_words(dictionary_file)
+
+    def usable(phrase):
+        words = phrase.lower().split()
+        return words and all(w in known for w in words)
+
+    targets = set()
+    for phrase in phrases:
+        if usable(phrase):
+            targets.add(phrase.lower())
+            if phrase.split()[-1] in plural_heads and usable(phrase + "s"):
+                targets.add(phrase.lower() + "s")
+    verbs = sorted(v for v in verbs if usable(v))
+    if not targets or not verbs:
+        return None
+
+    return (
+        "#JSGF V1.0;\n"
+        "grammar commands;\n"
+        f"<verb> = {' | '.join(sorted(verbs))};\n"
+        f"<target> = {' | '.join(sorted(targets))};\n"
+        "public <command> = [please] <verb> [the] <target> [and [the] <target>] [on | off];\n"
+    )
+
+
+def command_grammar(dictionary_file):
+    """Grammar restricted to the controllable entity names in the registry"""
+    from entity_registry import get_registry, entity_name, CONTROLLABLE_DOMAINS
+    from intent_engine import VERBS, ALIASES, HEAD_WORDS, _core_phrase
+
+    phrases = set(ALIASES) | {spoken for _, spoken in ALIASES.values()}
+    for entity in get_registry().entities:
+        if entity["entity_id"].split(".", 1)[0] not in CONTROLLABLE_DOMAINS:
+            continue
+        words = re.findall(r"[a-z']+|\d+", entity_name(entity).lower())
+        phrases.add(" ".join(words))
+        phrases.add(" ".join(_core_phrase(words)))
+    return build_grammar(phrases, list(VERBS), dictionary_file, plural_heads=HEAD_WORDS)
+
+
+_main_lock = threading.Lock()
+
+
+class _WorkerProcess(SpawnProcess):
+    """Spawned without re-running the parent's __main__
+
+    spawn normally imports the launching script (e.g. main.py) into every
+    child as __mp_main__, repeating its module-level setup: Flask, the HA
+    client, dispatcher threads. The workers only need this module, so a
+    bare __main__ is swapped in while the child's start-up data is built.
+    """
+
+    def start(self):
+        with _main_lock:
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = types.ModuleType("__main__")
+            try:
+                super().start()
+            finally:
+                sys.modules["__main__"] = main
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+class SphinxPool:
+    """Process pool of PocketSphinx decoders, loaded once per worker and kept warm"""
+
+    def __init__(self, workers=SPHINX_WORKERS, use_grammar=False):
+        self.workers = workers
+        self.use_grammar = use_grammar
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        model_paths = sphinx_model_paths()
+        grammar = command_grammar(model_paths[2]) if self.use_grammar else None
+        context = _WorkerContext()
+        print(f"[SPHINX] Starting {self.workers} warm decoder(s){' with command grammar' if grammar else ''}")
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(model_paths, grammar))
+
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._start()
+        return self._executor
+
+    def warm(self):
+        """Spawn every worker and load its models now rather than on first use"""
+        executor = self.executor()
+        wait([executor.submit(_ping) for _ in range(self.workers)])
+        return self
+
+    def decode(self, audio_data, timeout=None):
+        """Transcribe WAV bytes; None if nothing was recognized"""
+        return self.executor().submit(_decode, audio_data).result(timeout)
+
+    def stream(self, audio, timeout=None):
+        """Transcribe an AudioStream, feeding a worker's decoder as the upload arrives
+
+        The samples go to the worker over a pipe, chunk by chunk, so decoding
+        runs alongside the upload. When the upload ends, only the last chunk
+        is left to decode.
+        """
+        connection, worker_end = _WorkerContext().Pipe()
+        try:
+            future = self.executor().submit(_decode_stream, worker_end)
+            if not connection.poll(timeout):
+                raise TimeoutError("no Sphinx worker free to stream to")
+            connection.recv()
+            worker_end.close()
+
+            frame = None
+            pending = b""
+            for chunk in audio.pcm_chunks():
+                if frame is None:
+                    rate = audio.sample_rate
+                    connection.send((rate, audio.channels, audio.sample_width))
+                    # Whole frames, in whole blocks when resample decimates
+                    block = rate // SPHINX_RATE if rate > SPHINX_RATE and rate % SPHINX_RATE == 0 else 1
+                    frame = audio.channels * audio.sample_width * block
+                data = pending + chunk if pending else chunk
+                usable = len(data) // frame * frame
+                pending = data[usable:]
+                if usable:
+                    connection.send_bytes(data, 0, usable)
+            if frame is None:
+                return None
+            if pending:
+                connection.send_bytes(pending)
+            connection.send_bytes(b"")
+            return future.result(timeout)
+        finally:
+            connection.close()
+            worker_end.close()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+if __name__ == "__main__":
+    import speech_recognition as sr
+    from io import BytesIO
+    from audio_preprocess import synthetic_clip, preprocess_audio
+
+    if len(sys.argv) > 1:
+        clips = [open(path, "rb").read() for path in sys.argv[1:]]
+    else:
+        clips = [preprocess_audio(synthetic_clip(rate=16000, seed=i), "bench_mic") for i in range(4)]
+
+    recognizer = sr.Recognizer()
+    start = time.perf_counter()
+    for clip in clips:
+        with sr.AudioFile(BytesIO(clip)) as source:
+            audio = recognizer.record(source)
+        try:
+            recognizer.recognize_sphinx(audio)
+        except sr.UnknownValueError:
+            pass
+    cold = (time.perf_counter() - start) / len(clips)
+    print(f"Cold recognize_sphinx: {cold * 1000:.0f} ms per clip")
+
+    for use_grammar in (False, True):
+        pool = SphinxPool(workers=1, use_grammar=use_grammar)
+        start = time.perf_counter()
+        pool.warm()
+        print(f"Pool warm-up ({'grammar' if use_grammar else 'language model'}): "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        start = time.perf_counter()
+        for clip in clips:
+            pool.decode(clip)
+        warm = (time.perf_counter() - start) / len(clips)
+        print(f"Warm decode ({'grammar' if use_grammar else 'language model'}): "
+              f"{warm * 1000:.0f} ms per clip ({cold / warm:.1f}x faster)")
+        pool.shutdown()
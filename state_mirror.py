@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import threading
+import websocket
+from dotenv import load_dotenv
+from entity_registry import get_registry
+from entity_store import get_entity_store
+
+load_dotenv()
+
+HA_URL = os.getenv("HA_URL", "http://homeassistant.local:8123")
+HA_TOKEN = os.getenv("HA_TOKEN")
+
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 30.0
+PING_INTERVAL = float(os.getenv("HA_PING_INTERVAL", "30"))
+PONG_TIMEOUT = float(os.getenv("HA_PONG_TIMEOUT", "10"))
+
+
+def websocket_url(ha_url):
+    """Turn an HA base URL into its /api/websocket endpoint"""
+    if ha_url.startswith("https://"):
+        ha_url = "wss://" + ha_url[len("https://"):]
+    elif ha_url.startswith("http://"):
+        ha_url = "ws://" + ha_url[len("http://"):]
+    return ha_url.rstrip("/") + "/api/websocket"
+
+
+class StateMirror:
+    """Keep the entity registry in sync with HA over the WebSocket API
+
+    Takes one get_states snapshot per connection, then applies state_changed
+    events as incremental patches. On any disconnect it backs off, reconnects
+    and resyncs from a fresh snapshot so no events are silently lost. A quiet
+    connection is pinged every ping_interval seconds, and one that stays silent
+    for pong_timeout after a ping is treated as dropped.
+    """
+
+    def __init__(self, url=None, token=None, registry=None, store=None, timeout=10,
+                 ping_interval=PING_INTERVAL, pong_timeout=PONG_TIMEOUT):
+        self.url = url or websocket_url(HA_URL)
+        self.token = token or HA_TOKEN
+        self.registry = registry or get_registry()
+        self.store = store
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.pong_timeout = pong_timeout
+        self.connected = threading.Event()
+        self.events_applied = 0
+        self.resyncs = 0
+        self.last_event_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+        self._next_id = 1
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ha-state-mirror", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wait_until_synced(self, timeout=None):
+        return self.connected.wait(timeout)
+
+    def _send(self, message):
+        message["id"] = self._next_id
+        self._next_id += 1
+        self._ws.send(json.dumps(message))
+        return message["id"]
+
+    def _recv(self):
+        raw = self._ws.recv()
+        if not raw:
+            raise ConnectionError("connection closed by Home Assistant")
+        return json.loads(raw)
+
+    def _wait_result(self, message_id):
+        while True:
+            message = self._recv()
+            if message.get("type") == "result" and message.get("id") == message_id:
+                if not message.get("success"):
+                    raise RuntimeError(f"HA request {message_id} failed: {message.get('error')}")
+                return message.get("result")
+
+    def _connect(self):
+        self._ws = websocket.create_connection(self.url, timeout=self.timeout)
+        self._next_id = 1
+
+        hello = self._recv()
+        if hello.get("type") != "auth_required":
+            raise RuntimeError(f"Unexpected greeting: {hello}")
+        self._ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+        auth = self._recv()
+        if auth.get("type") != "auth_ok":
+            raise RuntimeError(f"Authentication failed: {auth.get('message', auth.get('type'))}")
+
+        # Subscribe first so no change between snapshot and subscription is missed
+        subscription = self._send({"type": "subscribe_events", "event_type": "state_changed"})
+        self._wait_result(subscription)
+        states_request = self._send({"type": "get_states"})
+        states = self._wait_result(states_request)
+        self.registry.replace(states)
+        if self.store is not None:
+            # Keep the on-disk snapshot fresh for the next startup; only changed rows are written
+            try:
+                self.store.sync(states)
+            except Exception as e:
+                print(f"[MIRROR] Could not update entity store: {e}")
+        self.resyncs += 1
+        print(f"[MIRROR] Synced {len(states)} entities from {self.url}")
+        self.connected.set()
+
+    def _listen(self):
+        self._ws.settimeout(min(1, self.ping_interval, self.pong_timeout))
+        last_message = time.monotonic()
+        pinged_at = None
+        while not self._stop.is_set():
+            try:
+                message = self._recv()
+            except websocket.WebSocketTimeoutException:
+                # A half-open TCP connection never errors, so probe it
+                now = time.monotonic()
+                if pinged_at is not None:
+                    if now - pinged_at >= self.pong_timeout:
+                        raise ConnectionError(f"no reply to ping within {self.pong_timeout:.0f}s")
+                elif now - last_message >= self.ping_interval:
+                    self._send({"type": "ping"})
+                    pinged_at = now
+                continue
+            last_message = time.monotonic()
+            pinged_at = None
+            if message.get("type") != "event":
+                continue
+            event = message.get("event", {})
+            if event.get("event_type") != "state_changed":
+                continue
+            data = event.get("data", {})
+            self.registry.apply(data.get("entity_id"), data.get("new_state"))
+            self.events_applied += 1
+            self.last_event_at = time.time()
+
+    def _run(self):
+        delay = RECONNECT_MIN
+        while not self._stop.is_set():
+            try:
+                self._connect()
+                delay = RECONNECT_MIN
+                self._listen()
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"[MIRROR] Connection lost: {e}. Reconnecting in {delay:.0f}s")
+            finally:
+                self.connected.clear()
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, RECONNECT_MAX)
+
+
+_mirror = None
+
+
+def start_state_mirror(url=None, token=None):
+    """Start the shared background state mirror"""
+    global _mirror
+    if _mirror is None:
+        _mirror = StateMirror(url=url, token=token, store=get_entity_store())
+    return _mirror.start()
+
+
+def get_state_mirror():
+    return _mirror
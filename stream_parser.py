@@ -0,0 +1,148 @@
+import json
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONParser:
+    """Incrementally parse one top-level JSON object from streamed text chunks
+
+    Calls on_field(key, value) as soon as each top-level value is complete and
+    on_string(key, delta) with decoded text as string values arrive, so callers
+    can act on {"entity", "intent"} before the model finishes the "response".
+    Anything before the opening brace (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self, on_field=None, on_string=None):
+        self.on_field = on_field
+        self.on_string = on_string
+        self.fields = {}
+        self.done = False
+        self._state = "start"
+        self._key = None
+        self._buf = []
+        self._escape = None
+        self._depth = 0
+        self._nested_in_string = False
+
+    def feed(self, chunk):
+        delta = []
+        for char in chunk:
+            if self.done:
+                break
+            self._step(char, delta)
+        if delta and self._state == "string_value":
+            self._emit_string("".join(delta))
+        return self.fields
+
+    def _emit_string(self, text):
+        if text and self.on_string:
+            self.on_string(self._key, text)
+
+    def _emit_field(self, value):
+        self.fields[self._key] = value
+        if self.on_field:
+            self.on_field(self._key, value)
+        self._key = None
+
+    def _read_string_char(self, char):
+        """Decode one char of a JSON string; returns (text, closed)"""
+        if self._escape is not None:
+            if self._escape == "":
+                if char == "u":
+                    self._escape = "u"
+                    return "", False
+                self._escape = None
+                return _ESCAPES.get(char, char), False
+            self._escape += char
+            if len(self._escape) == 5:
+                code = int(self._escape[1:], 16)
+                self._escape = None
+                return chr(code), False
+            return "", False
+        if char == "\\":
+            self._escape = ""
+            return "", False
+        if char == '"':
+            return "", True
+        return char, False
+
+    def _step(self, char, delta):
+        state = self._state
+
+        if state == "start":
+            if char == "{":
+                self._state = "key_or_end"
+
+        elif state == "key_or_end":
+            if char == '"':
+                self._buf = []
+                self._state = "key"
+            elif char == "}":
+                self.done = True
+
+        elif state == "key":
+            text, closed = self._read_string_char(char)
+            if closed:
+                self._key = "".join(self._buf)
+                self._state = "colon"
+            else:
+                self._buf.append(text)
+
+        elif state == "colon":
+            if char == ":":
+                self._state = "value_start"
+
+        elif state == "value_start":
+            if char.isspace():
+                return
+            if char == '"':
+                self._buf = []
+                self._state = "string_value"
+            elif char in "{[":
+                self._buf = [char]
+                self._depth = 1
+                self._nested_in_string = False
+                self._state = "nested"
+            else:
+                self._buf = [char]
+                self._state = "scalar"
+
+        elif state == "string_value":
+            text, closed = self._read_string_char(char)
+            if closed:
+                if delta:
+                    self._emit_string("".join(delta))
+                    delta.clear()
+                self._emit_field("".join(self._buf))
+                self._state = "key_or_end"
+            elif text:
+                self._buf.append(text)
+                delta.append(text)
+
+        elif state == "nested":
+            self._buf.append(char)
+            if self._nested_in_string:
+                if self._escape is not None:
+                    self._escape = None
+                elif char == "\\":
+                    self._escape = ""
+                elif char == '"':
+                    self._nested_in_string = False
+            elif char == '"':
+                self._nested_in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit_field(json.loads("".join(self._buf)))
+                    self._state = "key_or_end"
+
+        elif state == "scalar":
+            if char in ",}" or char.isspace():
+                self._emit_field(json.loads("".join(self._buf)))
+                self._state = "key_or_end"
+                if char == "}":
+                    self.done = True
+            else:
+                self._buf.append(char)
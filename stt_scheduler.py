@@ -0,0 +1,216 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from metrics import observe, submit_traced
+from audio_stream import AudioStream, UploadError
+
+
+class CircuitBreaker:
+    """Skip a backend after repeated errors until it has had time to recover
+
+    closed -> open after `failure_threshold` consecutive errors. After
+    `reset_timeout` seconds one trial request is let through (half-open);
+    success closes the breaker again, failure re-opens it. A trial that has
+    not reported back within another `reset_timeout` is presumed hung and a
+    new one is allowed.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_timeout:
+                # opened_at doubles as the start of the half-open trial
+                self.state = "half_open"
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class STTBackend:
+    """A named transcription function plus its circuit breaker
+
+    transcribe(audio_data) returns text, returns None when the audio was
+    understood to contain no usable speech, or raises on backend errors.
+    Only raised errors count against the breaker. Backends that can decode
+    incrementally also pass stream(audio_stream), which is started as soon
+    as an AudioStream upload begins.
+    """
+
+    def __init__(self, name, transcribe, enabled=None, stream=None, failure_threshold=3, reset_timeout=30.0):
+        self.name = name
+        self.inflight = 0
+        self.transcribe = transcribe
+        self.stream = stream
+        self.enabled = enabled or (lambda: True)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+
+    def status(self):
+        return {
+            "enabled": bool(self.enabled()),
+            "breaker": self.breaker.state,
+            "calls": self.calls,
+            "inflight": self.inflight,
+            "errors": self.errors,
+            "wins": self.wins,
+        }
+
+
+class STTScheduler:
+    """Run STT backends in preference order, hedging slow ones
+
+    The first backend starts immediately. If it has not produced an
+    acceptable result within `hedge_delay` seconds (or fails sooner), the
+    next backend is launched alongside it, and so on. The first acceptable
+    result from any running backend wins.
+
+    Each backend may hold at most `workers // len(backends)` threads of the
+    shared pool, so calls that never return can only starve their own
+    backend. A call still running when the scheduler times out counts as a
+    failure, which opens the breaker of a backend that keeps hanging.
+    """
+
+    def __init__(self, backends, hedge_delay=1.5, timeout=20.0, workers=None):
+        self.backends = list(backends)
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        workers = workers or max(len(self.backends), 1) * 4
+        self.max_inflight = max(workers // max(len(self.backends), 1), 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stt")
+        self._lock = threading.Lock()
+
+    def _claim(self, backend):
+        """Reserve a thread for backend; False if it already uses its share"""
+        with self._lock:
+            if backend.inflight >= self.max_inflight:
+                return False
+            backend.inflight += 1
+            return True
+
+    def _submit(self, backend, audio, streaming=False):
+        return submit_traced(self._executor, self._run, backend, audio, streaming)
+
+    def _run(self, backend, audio, streaming=False):
+        start = time.perf_counter()
+        backend.calls += 1
+        try:
+            result = backend.stream(audio) if streaming else backend.transcribe(audio)
+        except UploadError:
+            raise
+        except Exception as e:
+            backend.errors += 1
+            backend.breaker.record_failure()
+            print(f"[STT] {backend.name} failed: {e} (breaker {backend.breaker.state})")
+            raise
+        finally:
+            observe(f"stt.{backend.name}", time.perf_counter() - start)
+            with self._lock:
+                backend.inflight -= 1
+        backend.breaker.record_success()
+        return result
+
+    def transcribe(self, audio, prepare=None):
+        """Transcribe WAV bytes or an in-progress AudioStream upload
+
+        prepare(audio_data) may rewrite the buffered WAV before the backends
+        see it, or return None to skip transcription entirely.
+        """
+        candidates = [b for b in self.backends if b.enabled()]
+        prestarted = {}
+
+        if isinstance(audio, AudioStream):
+            # Streaming backends decode while the upload is still arriving; their
+            # results are only used once their turn in the preference order comes
+            for backend in candidates:
+                if backend.stream and backend.breaker.allow() and self._claim(backend):
+                    prestarted[backend] = self._submit(backend, audio, True)
+            if not audio.wait(self.timeout):
+                print(f"[STT] Audio upload failed: {audio.error}")
+                return None
+            audio_data = audio.getvalue()
+        else:
+            audio_data = audio
+
+        if prepare:
+            audio_data = prepare(audio_data)
+            if audio_data is None and not prestarted:
+                return None
+
+        deadline = time.monotonic() + self.timeout
+        pending = {}
+        queue = iter(candidates)
+
+        def launch_next():
+            for backend in queue:
+                if backend in prestarted:
+                    pending[prestarted.pop(backend)] = backend
+                    return True
+                if audio_data is None:
+                    continue
+                if not self._claim(backend):
+                    print(f"[STT] Skipping {backend.name} ({backend.inflight} calls still running)")
+                    continue
+                if backend.breaker.allow():
+                    print(f"[STT] Trying {backend.name}...")
+                    pending[self._submit(backend, audio_data)] = backend
+                    return True
+                with self._lock:
+                    backend.inflight -= 1
+                print(f"[STT] Skipping {backend.name} (circuit open)")
+            return False
+
+        more = launch_next()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print("[STT] Transcription timed out")
+                for backend in pending.values():
+                    backend.breaker.record_failure()
+                break
+            done, _ = wait(pending, timeout=min(self.hedge_delay, remaining) if more else remaining,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Hedge: the running backends are slow, start the next one too
+                more = launch_next()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                if result and result.strip():
+                    backend.wins += 1
+                    return result
+            if not pending:
+                more = launch_next()
+
+        print("[STT] All transcription methods failed")
+        return None
+
+    def status(self):
+        return {backend.name: backend.status() for backend in self.backends}
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, ROOT)
+
+# Index the checked-in sample entities, and keep caches and snapshots out of the working tree
+_scratch = tempfile.mkdtemp(prefix="jarvis-tests-")
+os.environ["ENTITIES_FILE"] = os.path.join(ROOT, "entities.json")
+os.environ["ENTITY_STORE_FILE"] = os.path.join(_scratch, "entities.db")
+os.environ["INTENT_CACHE_FILE"] = os.path.join(_scratch, "intent_cache.json")
@@ -0,0 +1,88 @@
+import io
+import wave
+import threading
+import pytest
+from audio_stream import AudioStream, UploadError, UploadTooLarge, wav_header
+
+PCM = bytes(range(256)) * 40     # 10240 bytes, more than two READ_SIZE chunks
+
+
+def wav_bytes(frames, rate=16000, channels=1, width=2, extra_chunk=b""):
+    """A WAV file with an optional LIST chunk between fmt and data"""
+    header = bytearray(wav_header(rate, channels, width, len(frames)))
+    if extra_chunk:
+        header[36:36] = b"LIST" + len(extra_chunk).to_bytes(4, "little") + extra_chunk
+    return bytes(header) + frames
+
+
+def read_wav(data):
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        return wav.getframerate(), wav.getnchannels(), wav.readframes(wav.getnframes())
+
+
+def test_pcm_header_is_patched_on_close():
+    stream = AudioStream(pcm_format=(16000, 1, 2))
+    stream.ingest(io.BytesIO(PCM), len(PCM))
+    assert read_wav(stream.getvalue()) == (16000, 1, PCM)
+
+
+def test_ingest_stops_at_content_length():
+    stream = AudioStream(pcm_format=(8000, 1, 2))
+    stream.ingest(io.BytesIO(PCM + b"trailing junk"), len(PCM))
+    assert read_wav(stream.getvalue())[2] == PCM
+
+
+@pytest.mark.parametrize("split", [1, 11, 20, 37, 44, 52, 60])
+def test_wav_header_parsed_across_chunk_boundaries(split):
+    data = wav_bytes(PCM, rate=22050, extra_chunk=b"INFOtest")
+    stream = AudioStream()
+    stream.write(data[:split])
+    stream.write(data[split:])
+    stream.close()
+    assert (stream.sample_rate, stream.channels, stream.sample_width) == (22050, 1, 2)
+    assert stream.data_offset == len(data) - len(PCM)
+    assert b"".join(stream.pcm_chunks()) == PCM
+
+
+def test_non_wav_upload_is_rejected():
+    with pytest.raises(UploadError):
+        AudioStream().write(b"ID3\x04\x00\x00\x00\x00\x00\x00\x00\x00")
+
+
+def test_pcm_chunks_follow_the_upload_and_end_with_it():
+    stream = AudioStream(pcm_format=(16000, 1, 2))
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(stream.pcm_chunks()))
+    reader.start()
+    for i in range(0, len(PCM), 1000):
+        stream.write(PCM[i:i + 1000])
+    stream.close()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert b"".join(received) == PCM
+
+
+def test_pcm_chunks_of_a_headerless_upload_end_cleanly():
+    stream = AudioStream()
+    stream.write(b"RIFF")
+    stream.close()
+    assert list(stream.pcm_chunks()) == []
+
+
+def test_pcm_chunks_raise_when_the_upload_fails():
+    stream = AudioStream(pcm_format=(16000, 1, 2))
+    stream.write(PCM[:1000])
+    chunks = stream.pcm_chunks()
+    assert next(chunks) == PCM[:1000]
+    stream.close(error=ConnectionResetError("client went away"))
+    with pytest.raises(UploadError):
+        next(chunks)
+    with pytest.raises(UploadError):
+        stream.getvalue()
+
+
+def test_upload_past_max_size_is_refused():
+    stream = AudioStream(pcm_format=(16000, 1, 2), max_size=4096)
+    with pytest.raises(UploadTooLarge):
+        stream.ingest(io.BytesIO(PCM))
+    assert len(stream) <= 4096
@@ -0,0 +1,170 @@
+import io
+import time
+import wave
+import threading
+import numpy as np
+import pytest
+from coalesce import Coalescer, audio_fingerprint
+
+RATE = 16000
+
+
+def utterance(seed, lag=0.0, gain=1.0, noise=0.01, seconds=2.0):
+    """WAV bytes of noise shaped into random 'syllables', starting `lag` seconds late"""
+    rng = np.random.default_rng(seed)
+    envelope = np.repeat(rng.uniform(0.05, 1.0, int(seconds * 10)), RATE // 10)
+    speech = rng.standard_normal(len(envelope)) * envelope * 0.3
+    quiet = np.zeros(int(lag * RATE))
+    samples = np.concatenate([quiet, speech])[:int(seconds * RATE)] * gain
+    samples += np.random.default_rng(seed + 1000).standard_normal(len(samples)) * noise
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def run_together(coalescer, requests, stagger=0.05):
+    """Run (key, device, work, level) requests on threads; {device: result or exception}"""
+    outcomes = {}
+
+    def call(key, device, work, level):
+        try:
+            outcomes[device] = coalescer.run(key, device, work, level)
+        except Exception as e:
+            outcomes[device] = e
+
+    threads = []
+    for request in requests:
+        thread = threading.Thread(target=call, args=request)
+        thread.start()
+        threads.append(thread)
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join(5)
+    return outcomes
+
+
+def slow(result, calls):
+    def work(reply):
+        calls.append(result)
+        time.sleep(0.2)
+        return result
+    return work
+
+
+def test_followers_share_the_leaders_result():
+    coalescer = Coalescer(window=1.0, settle=0)
+    calls = []
+    outcomes = run_together(coalescer, [
+        ("lights on", "kitchen", slow("done", calls), None),
+        ("lights on", "hallway", slow("again", calls), None),
+    ])
+    assert outcomes == {"kitchen": "done", "hallway": "done"}
+    assert calls == ["done"]
+    assert coalescer.stats() == {"leaders": 1, "coalesced": 1}
+
+
+def test_followers_share_the_leaders_error():
+    coalescer = Coalescer(window=1.0, settle=0)
+
+    def failing(reply):
+        time.sleep(0.2)
+        raise RuntimeError("HA unreachable")
+
+    outcomes = run_together(coalescer, [
+        ("lights on", "kitchen", failing, None),
+        ("lights on", "hallway", failing, None),
+    ])
+    assert isinstance(outcomes["kitchen"], RuntimeError)
+    assert outcomes["hallway"] is outcomes["kitchen"]
+
+
+def test_requests_after_the_window_run_again():
+    coalescer = Coalescer(window=0.1, settle=0)
+    calls = []
+    assert coalescer.run("lights on", "kitchen", lambda reply: calls.append(1) or "first") == "first"
+    time.sleep(0.15)
+    assert coalescer.run("lights on", "hallway", lambda reply: calls.append(2) or "second") == "second"
+    assert calls == [1, 2]
+    assert coalescer.stats()["leaders"] == 2
+
+
+def test_same_device_never_joins_its_own_request():
+    coalescer = Coalescer(window=1.0, settle=0)
+    calls = []
+    outcomes = run_together(coalescer, [
+        ("lights on", "kitchen", slow("first", calls), None),
+        ("lights on", "kitchen", slow("second", calls), None),
+    ])
+    assert sorted(calls) == ["first", "second"]
+    assert coalescer.stats() == {"leaders": 2, "coalesced": 0}
+    assert outcomes["kitchen"] in ("first", "second")
+
+
+def test_reply_goes_to_the_loudest_device_after_settle():
+    spoken = []
+    coalescer = Coalescer(window=1.0, settle=0.3, speak=lambda message, device: spoken.append((message, device)))
+
+    def work(reply):
+        reply("Kitchen lights on")
+        assert spoken == []     # held until the other mics have had a chance to join
+        time.sleep(0.1)
+        return "ok"
+
+    run_together(coalescer, [
+        ("lights on", "hallway", work, 2.0),
+        ("lights on", "kitchen", work, 9.0),
+        ("lights on", "bedroom", work, 4.0),
+    ])
+    time.sleep(0.4)
+    assert spoken == [("Kitchen lights on", "kitchen")]
+
+
+def test_replies_after_settle_are_spoken_at_once():
+    spoken = []
+    coalescer = Coalescer(window=1.0, settle=0.05, speak=lambda message, device: spoken.append((message, device)))
+
+    def work(reply):
+        reply("One")
+        time.sleep(0.1)
+        reply("Two")
+        assert spoken == [("One", "kitchen"), ("Two", "kitchen")]
+        return "ok"
+
+    assert coalescer.run("lights on", "kitchen", work, 1.0) == "ok"
+
+
+def test_fingerprint_matches_the_same_utterance_on_another_mic():
+    near = audio_fingerprint(utterance(1, lag=0.3))
+    far = audio_fingerprint(utterance(1, lag=0.5, gain=0.3))
+    assert near.similar(far) and far.similar(near)
+    assert near.level > far.level
+
+
+@pytest.mark.parametrize("seed", [2, 3, 4])
+def test_fingerprint_rejects_a_different_utterance(seed):
+    assert not audio_fingerprint(utterance(1)).similar(audio_fingerprint(utterance(seed)))
+
+
+def test_fingerprint_rejects_very_different_lengths():
+    assert not audio_fingerprint(utterance(1)).similar(audio_fingerprint(utterance(1, seconds=0.6)))
+
+
+def test_fingerprints_coalesce_across_devices():
+    coalescer = Coalescer(window=1.0, settle=0)
+    calls = []
+    outcomes = run_together(coalescer, [
+        (audio_fingerprint(utterance(1)), "kitchen", slow("done", calls), None),
+        (audio_fingerprint(utterance(1, lag=0.2, gain=0.5)), "hallway", slow("again", calls), None),
+        (audio_fingerprint(utterance(5)), "bedroom", slow("other", calls), None),
+    ])
+    assert outcomes == {"kitchen": "done", "hallway": "done", "bedroom": "other"}
+    assert sorted(calls) == ["done", "other"]
+
+
+def test_undecodable_audio_has_no_fingerprint():
+    assert audio_fingerprint(b"not a wav") is None
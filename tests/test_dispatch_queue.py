@@ -0,0 +1,113 @@
+import time
+import threading
+from dispatch_queue import DispatchQueue
+
+
+def blocker():
+    """A task that holds its worker until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def task():
+        started.set()
+        release.wait(5)
+
+    return task, started, release
+
+
+def test_same_key_runs_in_order_without_overlap():
+    queue = DispatchQueue(workers=4)
+    order, active, overlaps = [], [], []
+
+    def task(i):
+        active.append(i)
+        if len(active) > 1:
+            overlaps.append(list(active))
+        time.sleep(0.01)
+        order.append(i)
+        active.remove(i)
+
+    for i in range(10):
+        queue.submit("speaker", task, i)
+    assert queue.drain(5)
+    assert order == list(range(10))
+    assert not overlaps
+
+
+def test_different_keys_run_in_parallel():
+    queue = DispatchQueue(workers=2)
+    task, started, release = blocker()
+    queue.submit("kitchen", task)
+    assert started.wait(1)
+    done = threading.Event()
+    queue.submit("bathroom", done.set)
+    assert done.wait(1)
+    release.set()
+    assert queue.drain(5)
+
+
+def test_merge_combines_waiting_tasks():
+    queue = DispatchQueue(workers=1)
+    task, started, release = blocker()
+    spoken = []
+    merge = lambda old, new: (old[0] + " " + new[0],)
+
+    queue.submit("speaker", task)
+    assert started.wait(1)
+    queue.submit("speaker", spoken.append, "one.", merge=merge)
+    queue.submit("speaker", spoken.append, "two.", merge=merge)
+    release.set()
+    assert queue.drain(5)
+    assert spoken == ["one. two."]
+    assert queue.stats()["merged"] == 1
+
+
+def test_drop_oldest_of_same_key_keeps_worker_alive():
+    # Dropping the only waiting task for a key used to orphan its queue and kill the worker
+    queue = DispatchQueue(workers=1, max_pending=1)
+    task, started, release = blocker()
+    ran = []
+
+    queue.submit("kitchen", task)
+    assert started.wait(1)
+    assert queue.submit("bathroom", ran.append, 1)
+    assert queue.submit("bathroom", ran.append, 2)
+    release.set()
+    assert queue.drain(5)
+    assert ran == [2]
+    assert queue.stats()["dropped"] == 1
+    assert all(thread.is_alive() for thread in queue._threads)
+
+
+def test_drop_new_refuses_when_full():
+    queue = DispatchQueue(workers=1, max_pending=1, policy="drop_new")
+    task, started, release = blocker()
+    ran = []
+
+    queue.submit("kitchen", task)
+    assert started.wait(1)
+    assert queue.submit("kitchen", ran.append, 1)
+    assert not queue.submit("kitchen", ran.append, 2)
+    release.set()
+    assert queue.drain(5)
+    assert ran == [1]
+
+
+def test_failed_task_is_counted_and_worker_continues():
+    queue = DispatchQueue(workers=1)
+    ran = []
+    queue.submit("speaker", lambda: 1 / 0)
+    queue.submit("speaker", ran.append, "after")
+    assert queue.drain(5)
+    assert ran == ["after"]
+    assert queue.stats()["failed"] == 1
+    assert queue.stats()["completed"] == 1
+
+
+def test_shutdown_finishes_queued_work_and_refuses_more():
+    queue = DispatchQueue(workers=1)
+    ran = []
+    for i in range(5):
+        queue.submit("speaker", ran.append, i)
+    assert queue.shutdown(5)
+    assert ran == list(range(5))
+    assert not queue.submit("speaker", ran.append, 5)
@@ -0,0 +1,97 @@
+import json
+import sqlite3
+import pytest
+from entity_store import EntityStore, SCHEMA_VERSION
+
+
+def entity(entity_id, state="off", updated="00", name=None):
+    return {
+        "entity_id": entity_id,
+        "state": state,
+        "attributes": {"friendly_name": name or entity_id.split(".", 1)[1].title(), "icon": "mdi:lightbulb"},
+        "last_changed": "2026-01-01T00:00:00+00:00",
+        "last_updated": f"2026-01-01T00:00:{updated}+00:00",
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EntityStore(str(tmp_path / "entities.db"))
+    yield store
+    store.close()
+
+
+def test_first_sync_adds_everything(store):
+    assert not store.exists()
+    changes = store.sync([entity("light.kitchen"), entity("switch.fan"), {"entity_id": "broken"}])
+    assert changes == {"added": 2, "changed": 0, "removed": 0, "unchanged": 0}
+    assert store.exists()
+
+
+def test_sync_counts_changed_removed_and_unchanged(store):
+    store.sync([entity("light.kitchen"), entity("switch.fan"), entity("light.porch")])
+    changes = store.sync([entity("light.kitchen", "on", updated="05"), entity("light.porch"),
+                          entity("sensor.power")])
+    assert changes == {"added": 1, "changed": 1, "removed": 1, "unchanged": 1}
+    assert store.get("light.kitchen")["state"] == "on"
+    assert store.get("switch.fan") is None
+
+
+def test_counts_survive_a_reopen(store):
+    store.sync([entity("light.kitchen"), entity("switch.fan")])
+    store.close()
+    reopened = EntityStore(store.path)
+    try:
+        assert reopened.sync([entity("light.kitchen"), entity("switch.fan")])["unchanged"] == 2
+    finally:
+        reopened.close()
+
+
+def test_rows_keep_only_what_the_registry_reads(store):
+    store.sync([entity("light.kitchen", name="Kitchen Lights")])
+    assert store.get("light.kitchen") == {
+        "entity_id": "light.kitchen",
+        "state": "off",
+        "last_changed": "2026-01-01T00:00:00+00:00",
+        "last_updated": "2026-01-01T00:00:00+00:00",
+        "attributes": {"friendly_name": "Kitchen Lights"},
+    }
+    assert store.domain("light") == [store.get("light.kitchen")]
+    assert store.summary() == [{"entity_id": "light.kitchen", "name": "Kitchen Lights", "domain": "light"}]
+
+
+def test_rows_are_plain_json(store):
+    store.sync([entity("light.kitchen", "on")])
+    store.close()
+    conn = sqlite3.connect(store.path)
+    try:
+        data, state = conn.execute("SELECT data, json_extract(data, '$.state') FROM entities").fetchone()
+    finally:
+        conn.close()
+    assert json.loads(data)["entity_id"] == "light.kitchen"
+    assert state == "on"
+
+
+def test_older_schema_is_dropped_and_refilled(tmp_path):
+    path = str(tmp_path / "entities.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(f"""
+        CREATE TABLE entities (entity_id TEXT PRIMARY KEY, domain TEXT NOT NULL, data BLOB NOT NULL);
+        INSERT INTO entities VALUES ('light.kitchen', 'light', x'80049500');
+        PRAGMA user_version = {SCHEMA_VERSION - 1};
+    """)
+    conn.close()
+
+    store = EntityStore(path)
+    try:
+        assert not store.exists()
+        assert store.load() == []
+        assert store.sync([entity("light.kitchen")])["added"] == 1
+        assert store.get("light.kitchen")["state"] == "off"
+    finally:
+        store.close()
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    finally:
+        conn.close()
@@ -0,0 +1,49 @@
+import pytest
+from openai import OpenAI
+import gpt_engine
+from fake_services import FakeServer, fake_openai
+from intent_cache import IntentCache
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    app = fake_openai([], chunk_delay=0)
+    server = FakeServer(app).start()
+    monkeypatch.setattr(gpt_engine, "client", OpenAI(api_key="test", base_url=f"{server.url}/v1", max_retries=0))
+    cache = IntentCache(str(tmp_path / "intent_cache.json"))
+    monkeypatch.setattr(gpt_engine, "get_intent_cache", lambda: cache)
+    yield app, cache
+    server.stop()
+
+
+def test_intent_fires_before_speech(fake_llm):
+    events = []
+    result = gpt_engine.ask_gpt_stream(
+        "make the workshop bright",
+        on_intent=lambda entity, intent: events.append(("intent", entity, intent)),
+        on_speech=lambda sentence: events.append(("speech", sentence)),
+    )
+    entity = result["entity"]
+    assert entity.startswith(("light.", "switch."))
+    assert events == [
+        ("intent", entity, "turn_on"),
+        ("speech", f"Okay, turning on {entity}."),
+        ("speech", "Anything else?"),
+    ]
+
+
+def test_result_is_cached(fake_llm):
+    app, cache = fake_llm
+    first = gpt_engine.ask_gpt_stream("make the workshop bright")
+    second = gpt_engine.ask_gpt_stream("make the workshop bright")
+    assert second["entity"] == first["entity"]
+    assert app.faults["chat"].requests == 1
+
+
+def test_failure_reports_error_without_intent(fake_llm):
+    app, _ = fake_llm
+    app.faults["chat"].failure_rate = 1.0
+    intents = []
+    result = gpt_engine.ask_gpt_stream("make the workshop bright", on_intent=lambda *args: intents.append(args))
+    assert "traceback" in result
+    assert intents == []
@@ -0,0 +1,86 @@
+import os
+import socket
+import pytest
+from fake_services import FakeServer, fake_home_assistant
+from ha_client import HAClient
+
+ENTITIES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "entities.json")
+
+
+@pytest.fixture
+def fake_ha():
+    app = fake_home_assistant(ENTITIES_FILE)
+    server = FakeServer(app).start()
+    yield app, server.url
+    server.stop()
+
+
+def client(url, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return HAClient(url, "test-token", **kwargs)
+
+
+def test_call_service_posts_payload(fake_ha):
+    app, url = fake_ha
+    assert client(url).call_service("light", "turn_on", {"entity_id": "light.kitchen"})
+    assert app.calls == [("light", "turn_on", {"entity_id": "light.kitchen"})]
+
+
+def test_call_services_batches_matching_calls(fake_ha):
+    app, url = fake_ha
+    results = client(url).call_services([
+        ("light.kitchen", "turn_on", None),
+        ("light.hallway", "turn_on", None),
+        ("light.landing", "turn_off", None),
+        ("switch.fan", "turn_on", None),
+    ])
+    assert results == {"light.kitchen": True, "light.hallway": True, "light.landing": True, "switch.fan": True}
+    calls = sorted(app.calls, key=lambda call: (call[0], call[1]))
+    assert calls == [
+        ("light", "turn_off", {"entity_id": "light.landing"}),
+        ("light", "turn_on", {"entity_id": ["light.kitchen", "light.hallway"]}),
+        ("switch", "turn_on", {"entity_id": "switch.fan"}),
+    ]
+
+
+def test_call_services_keeps_different_service_data_apart(fake_ha):
+    app, url = fake_ha
+    client(url).call_services([
+        ("light.kitchen", "turn_on", {"brightness": 255}),
+        ("light.hallway", "turn_on", {"brightness": 10}),
+    ])
+    assert len(app.calls) == 2
+
+
+def test_retries_unavailable_then_succeeds(fake_ha):
+    app, url = fake_ha
+    faults = app.faults["services"]
+    faults.fail_first = 2
+    assert client(url, retries=2).call_service("light", "turn_on", {"entity_id": "light.kitchen"})
+    assert faults.requests == 3
+    assert len(app.calls) == 1
+
+
+def test_gives_up_after_retries(fake_ha):
+    app, url = fake_ha
+    faults = app.faults["services"]
+    faults.failure_rate = 1.0
+    assert not client(url, retries=2).call_service("light", "turn_on", {"entity_id": "light.kitchen"})
+    assert faults.requests == 3
+    assert app.calls == []
+
+
+def test_does_not_retry_other_errors(fake_ha):
+    app, url = fake_ha
+    faults = app.faults["services"]
+    faults.failure_rate, faults.status = 1.0, 500
+    assert not client(url, retries=2).call_service("light", "turn_on", {"entity_id": "light.kitchen"})
+    assert faults.requests == 1
+
+
+def test_connection_errors_are_retried_then_reported():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    ha = client(f"http://127.0.0.1:{port}", retries=1, timeout=1)
+    assert ha.call_services([("light.kitchen", "turn_on", None)]) == {"light.kitchen": False}
@@ -0,0 +1,100 @@
+import json
+import pytest
+from intent_cache import IntentCache, normalize
+
+RESULT = {"entity": "light.kitchen", "intent": "turn_on", "response": "Kitchen light on"}
+
+
+class StubRegistry:
+    """Just enough of EntityRegistry for the cache: a fingerprint and get()"""
+
+    def __init__(self, entities=("light.kitchen", "light.bedroom")):
+        self.entities = set(entities)
+        self.fingerprint = "v1"
+
+    def get(self, entity_id):
+        return {"entity_id": entity_id} if entity_id in self.entities else None
+
+
+@pytest.fixture
+def registry():
+    return StubRegistry()
+
+
+def test_normalize_drops_filler_case_and_plurals():
+    assert normalize("Please turn on the Kitchen Lights") == normalize("on kitchen light")
+
+
+def test_normalize_keeps_word_order():
+    forward = normalize("turn on the kitchen light and turn off the bedroom light")
+    reverse = normalize("turn off the kitchen light and turn on the bedroom light")
+    assert forward != reverse
+
+
+def test_normalize_keeps_switch():
+    assert normalize("turn on the kitchen switch") != normalize("turn on the kitchen")
+
+
+def test_normalize_joins_number_words():
+    assert normalize("set the heating to twenty one degrees") == "set heating to 21 degree"
+
+
+def test_hit_returns_a_copy(registry):
+    cache = IntentCache(path=None, registry=registry)
+    cache.put("turn on the kitchen light", RESULT)
+    hit = cache.get("please turn on the kitchen lights")
+    assert hit == RESULT
+    hit["entity"] = "light.bedroom"
+    assert cache.get("turn on the kitchen light") == RESULT
+
+
+def test_refuses_unknown_entities_and_services(registry):
+    cache = IntentCache(path=None, registry=registry)
+    cache.put("turn on the garage", dict(RESULT, entity="light.garage"))
+    cache.put("turn on the kitchen", dict(RESULT, intent="rm -rf"))
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl(registry, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("intent_cache.time.time", lambda: now[0])
+    cache = IntentCache(path=None, ttl=60, registry=registry)
+    cache.put("turn on the kitchen light", RESULT)
+    now[0] += 59
+    assert cache.get("turn on the kitchen light") == RESULT
+    now[0] += 2
+    assert cache.get("turn on the kitchen light") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(registry):
+    cache = IntentCache(path=None, max_entries=2, registry=registry)
+    cache.put("kitchen on", RESULT)
+    cache.put("bedroom on", dict(RESULT, entity="light.bedroom"))
+    cache.get("kitchen on")
+    cache.put("kitchen off", dict(RESULT, intent="turn_off"))
+    assert cache.get("bedroom on") is None
+    assert cache.get("kitchen on") == RESULT
+    assert cache.stats()["evictions"] == 1
+
+
+def test_registry_change_invalidates_entries(registry):
+    cache = IntentCache(path=None, registry=registry)
+    cache.put("turn on the kitchen light", RESULT)
+    registry.fingerprint = "v2"
+    assert cache.get("turn on the kitchen light") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_entries_survive_a_restart(registry, tmp_path):
+    path = str(tmp_path / "intent_cache.json")
+    IntentCache(path=path, registry=registry).put("turn on the kitchen light", RESULT)
+    assert IntentCache(path=path, registry=registry).get("turn on the kitchen light") == RESULT
+
+
+def test_old_key_format_is_discarded_on_load(registry, tmp_path):
+    path = tmp_path / "intent_cache.json"
+    path.write_text(json.dumps({
+        "kitchen light on": {"result": RESULT, "fingerprint": "v1", "created": 4e9},
+    }))
+    assert IntentCache(path=str(path), registry=registry).stats()["entries"] == 0
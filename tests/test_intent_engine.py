@@ -0,0 +1,32 @@
+import pytest
+from intent_engine import match_command
+
+
+def targets(text):
+    return [(match["entity"], match["service"]) for match in match_command(text)]
+
+
+@pytest.mark.parametrize("text", [
+    "can you turn on the bathroom fan please",
+    "turn the light on in the bathroom",
+    "turn on the bedroom light",
+    "make the workshop bright",
+])
+def test_partial_matches_fall_through(text):
+    assert match_command(text) == []
+
+
+def test_each_target_binds_to_its_own_verb():
+    assert targets("turn on the kitchen lights and turn off the conservatory lights") == [
+        ("light.kitchen", "turn_on"),
+        ("switch.conservatory_lights_switch_1", "turn_off"),
+    ]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("pause the kitchen speaker", [("media_player.kitchen", "media_pause")]),
+    ("switch on the dining room socket", [("switch.dining_room_socket_1", "turn_on")]),
+    ("turn the kitchen lights off", [("light.kitchen", "turn_off")]),
+])
+def test_domain_words_and_split_particles(text, expected):
+    assert targets(text) == expected
@@ -0,0 +1,98 @@
+import os
+import time
+import pytest
+import state_mirror
+from entity_registry import EntityRegistry
+from entity_store import EntityStore
+from fake_services import FakeHAWebSocket
+from state_mirror import StateMirror
+
+ENTITIES_FILE = os.environ["ENTITIES_FILE"]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def fake_ws():
+    server = FakeHAWebSocket(ENTITIES_FILE, token="test-token").start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def mirror(fake_ws, tmp_path, monkeypatch):
+    monkeypatch.setattr(state_mirror, "RECONNECT_MIN", 0.05)
+    store = EntityStore(str(tmp_path / "entities.db"))
+    mirror = StateMirror(url=fake_ws.url, token="test-token", registry=EntityRegistry(), store=store, timeout=5)
+    yield mirror.start()
+    mirror.stop()
+    store.close()
+
+
+def light(state, name="Light "):
+    return {"entity_id": "light.light", "state": state, "attributes": {"friendly_name": name},
+            "last_changed": "2026-01-01T00:00:00+00:00", "last_updated": f"2026-01-01T00:00:{len(state):02d}+00:00"}
+
+
+def test_snapshot_fills_registry_and_store(fake_ws, mirror):
+    assert mirror.wait_until_synced(5)
+    assert len(mirror.registry.entities) == len(fake_ws.states)
+    assert len(mirror.store.load()) == len(fake_ws.states)
+    assert mirror.resyncs == 1
+
+
+def test_state_changed_events_patch_registry(fake_ws, mirror):
+    assert mirror.wait_until_synced(5)
+    fake_ws.push("light.light", light("on"))
+    assert wait_for(lambda: mirror.registry.state("light.light") == "on")
+    assert mirror.events_applied == 1
+
+
+def test_renames_and_removals_reindex(fake_ws, mirror):
+    assert mirror.wait_until_synced(5)
+    fake_ws.push("light.light", light("on", name="Porch lantern"))
+    assert wait_for(lambda: any(c["entity_id"] == "light.light" for c in mirror.registry.resolve("porch lantern")))
+    fake_ws.push("light.light", None)
+    assert wait_for(lambda: mirror.registry.get("light.light") is None)
+
+
+def test_resyncs_after_disconnect(fake_ws, mirror):
+    assert mirror.wait_until_synced(5)
+    fake_ws.drop()
+    # Changed while the mirror is away, so only the fresh snapshot can deliver it
+    fake_ws.push("light.light", light("on"), notify=False)
+    assert wait_for(lambda: mirror.resyncs == 2 and mirror.connected.is_set())
+    assert mirror.registry.state("light.light") == "on"
+    assert fake_ws.connections == 2
+
+
+def test_quiet_connection_is_kept_alive_with_pings(fake_ws, mirror):
+    mirror.ping_interval, mirror.pong_timeout = 0.05, 0.5
+    assert mirror.wait_until_synced(5)
+    assert wait_for(lambda: fake_ws.pings >= 3)
+    assert mirror.resyncs == 1
+
+
+def test_unanswered_ping_forces_a_resync(fake_ws, mirror):
+    mirror.ping_interval, mirror.pong_timeout = 0.05, 0.2
+    assert mirror.wait_until_synced(5)
+    fake_ws.answer_pings = False
+    assert wait_for(lambda: mirror.resyncs >= 2)
+    assert fake_ws.connections >= 2
+
+
+def test_rejected_token_never_syncs(fake_ws):
+    mirror = StateMirror(url=fake_ws.url, token="wrong", registry=EntityRegistry(), timeout=5).start()
+    try:
+        assert not mirror.wait_until_synced(0.5)
+        assert mirror.registry.entities == []
+        assert fake_ws.connections >= 1
+    finally:
+        mirror.stop()
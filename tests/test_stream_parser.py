@@ -0,0 +1,67 @@
+import json
+import pytest
+from stream_parser import IncrementalJSONParser
+
+DOCUMENTS = [
+    '{"entity": "light.kitchen", "intent": "turn_on", "response": "Turning on the kitchen light."}',
+    '{"entity":"light.x","intent":"turn_off","response":"Line\\nbreak, \\"quotes\\", caf\\u00e9 and \\\\ slash."}',
+    '{"entity": "climate.main_bedroom", "intent": "set_temperature", '
+    '"data": {"temperature": 21.5, "note": "braces } and ] in a string"}, "ids": [1, [2, 3]], '
+    '"confidence": 0.9, "confirm": true, "extra": null, "response": "Done."}',
+]
+
+
+def parse(chunks, **callbacks):
+    parser = IncrementalJSONParser(**callbacks)
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_every_split_point_matches_json_loads(document):
+    expected = json.loads(document)
+    for split in range(len(document) + 1):
+        parser = parse([document[:split], document[split:]])
+        assert parser.done
+        assert parser.fields == expected, split
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_char_by_char_string_deltas_rebuild_values(document):
+    strings = {}
+    parser = parse(document, on_string=lambda key, delta: strings.setdefault(key, []).append(delta))
+    expected = json.loads(document)
+    for key, deltas in strings.items():
+        assert "".join(deltas) == expected[key]
+    assert parser.fields == expected
+
+
+def test_fields_fire_as_soon_as_complete():
+    events = []
+    parser = IncrementalJSONParser(on_field=lambda key, value: events.append(key))
+    parser.feed('{"entity": "light.kitchen", "intent": "tu')
+    assert events == ["entity"]
+    parser.feed('rn_on", "response": "Turning on')
+    assert events == ["entity", "intent"]
+    parser.feed(' the light."}')
+    assert events == ["entity", "intent", "response"]
+    assert parser.done
+
+
+def test_leading_fence_and_trailing_text_are_ignored():
+    parser = parse(['```json\n{"entity": "light.a", ', '"intent": "turn_on"}\n``` more {"entity": "light.b"}'])
+    assert parser.fields == {"entity": "light.a", "intent": "turn_on"}
+
+
+def test_escape_split_across_chunks():
+    deltas = []
+    parser = parse(['{"response": "caf\\u00', 'e9\\', 'n"}'], on_string=lambda key, delta: deltas.append(delta))
+    assert parser.fields == {"response": "café\n"}
+    assert "".join(deltas) == "café\n"
+
+
+def test_incomplete_document_is_not_done():
+    parser = parse(['{"entity": "light.kitchen", "intent": "turn_on", "response": "Turn'])
+    assert not parser.done
+    assert parser.fields == {"entity": "light.kitchen", "intent": "turn_on"}
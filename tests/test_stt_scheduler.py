@@ -0,0 +1,167 @@
+import time
+import threading
+from audio_stream import AudioStream
+from stt_scheduler import CircuitBreaker, STTBackend, STTScheduler
+
+
+def backend(name, result=None, delay=0.0, error=None, calls=None, **kwargs):
+    def transcribe(audio_data):
+        if calls is not None:
+            calls.append((name, audio_data))
+        time.sleep(delay)
+        if error:
+            raise error
+        return result
+    return STTBackend(name, transcribe, **kwargs)
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_fast_first_backend_is_not_hedged():
+    calls = []
+    scheduler = STTScheduler([backend("a", "on", calls=calls), backend("b", "off", calls=calls)], hedge_delay=0.5)
+    assert scheduler.transcribe(b"wav") == "on"
+    assert [name for name, _ in calls] == ["a"]
+
+
+def test_slow_backend_is_hedged():
+    calls = []
+    slow = backend("slow", "slow result", delay=1.0, calls=calls)
+    fast = backend("fast", "fast result", calls=calls)
+    scheduler = STTScheduler([slow, fast], hedge_delay=0.05)
+    start = time.monotonic()
+    assert scheduler.transcribe(b"wav") == "fast result"
+    assert time.monotonic() - start < 0.5
+    assert [name for name, _ in calls] == ["slow", "fast"]
+    assert fast.wins == 1
+
+
+def test_error_launches_next_backend_without_waiting():
+    failing = backend("failing", error=RuntimeError("down"))
+    scheduler = STTScheduler([failing, backend("next", "text")], hedge_delay=5)
+    start = time.monotonic()
+    assert scheduler.transcribe(b"wav") == "text"
+    assert time.monotonic() - start < 1
+    assert failing.errors == 1
+    assert failing.breaker.failures == 1
+
+
+def test_empty_result_falls_through_without_tripping_breaker():
+    silent = backend("silent", "  ")
+    scheduler = STTScheduler([silent, backend("next", "text")], hedge_delay=5)
+    assert scheduler.transcribe(b"wav") == "text"
+    assert silent.breaker.failures == 0
+
+
+def test_open_breaker_and_disabled_backends_are_skipped():
+    calls = []
+    broken = backend("broken", "x", calls=calls, failure_threshold=1)
+    broken.breaker.record_failure()
+    disabled = backend("disabled", "x", calls=calls, enabled=lambda: False)
+    scheduler = STTScheduler([broken, disabled, backend("ok", "text", calls=calls)], hedge_delay=5)
+    assert scheduler.transcribe(b"wav") == "text"
+    assert [name for name, _ in calls] == ["ok"]
+
+
+def test_all_backends_failing_returns_none():
+    scheduler = STTScheduler([backend("a", error=RuntimeError()), backend("b")], hedge_delay=0.05)
+    assert scheduler.transcribe(b"wav") is None
+
+
+def test_timeout_returns_none():
+    scheduler = STTScheduler([backend("hung", "late", delay=1.0)], hedge_delay=0.05, timeout=0.1)
+    start = time.monotonic()
+    assert scheduler.transcribe(b"wav") is None
+    assert time.monotonic() - start < 0.5
+
+
+def test_prepare_rewrites_audio():
+    calls = []
+    scheduler = STTScheduler([backend("a", "text", calls=calls)])
+    assert scheduler.transcribe(b"raw", prepare=lambda data: data + b" trimmed") == "text"
+    assert calls == [("a", b"raw trimmed")]
+
+
+def test_stream_backend_starts_before_upload_finishes():
+    stream = AudioStream(pcm_format=(16000, 1, 2))
+    seen_before_close = threading.Event()
+
+    def decode_stream(audio):
+        received = b""
+        for chunk in audio.pcm_chunks():
+            received += chunk
+            if not audio.complete:
+                seen_before_close.set()
+        return f"{len(received)} bytes"
+
+    streaming = STTBackend("streaming", lambda audio_data: "buffered", stream=decode_stream)
+    scheduler = STTScheduler([streaming], hedge_delay=5)
+    result = []
+    worker = threading.Thread(target=lambda: result.append(scheduler.transcribe(stream)))
+    worker.start()
+    stream.write(b"\x00\x01" * 100)
+    assert seen_before_close.wait(1)
+    stream.write(b"\x00\x01" * 100)
+    stream.close()
+    worker.join(5)
+    assert result == ["400 bytes"]
+
+
+def test_hung_backend_cannot_starve_later_transcriptions():
+    never = threading.Event()
+    hung = STTBackend("hung", lambda audio_data: never.wait())
+    scheduler = STTScheduler([hung, backend("ok", "text")], hedge_delay=0.02, timeout=1.0, workers=4)
+    try:
+        for _ in range(8):
+            start = time.monotonic()
+            assert scheduler.transcribe(b"wav") == "text"
+            assert time.monotonic() - start < 0.5
+        assert hung.inflight == scheduler.max_inflight
+    finally:
+        never.set()
+
+
+def test_calls_outliving_the_timeout_open_the_breaker():
+    never = threading.Event()
+    hung = STTBackend("hung", lambda audio_data: never.wait(), failure_threshold=2)
+    scheduler = STTScheduler([hung], hedge_delay=0.02, timeout=0.05, workers=8)
+    try:
+        assert scheduler.transcribe(b"wav") is None
+        assert scheduler.transcribe(b"wav") is None
+        assert hung.breaker.state == "open"
+    finally:
+        never.set()
+
+
+def test_hung_half_open_trial_is_retried():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    # The trial never reports back; after another reset_timeout a new one goes through
+    time.sleep(0.06)
+    assert breaker.allow()